@@ -0,0 +1,60 @@
+import sys
+import os
+import json
+import tempfile
+from time import perf_counter
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+from lang_def import LangDef  # noqa: E402
+from lang_def_builder import LangDefBuilder  # noqa: E402
+
+
+GRAMMAR = """
+    PROG -> STMTS
+    STMTS -> STMTS STMT | STMT
+    STMT -> "let" id "=" EXPR ";" | "return" EXPR ";" | EXPR ";"
+    STMT -> "if" "(" EXPR ")" BLOCK | "if" "(" EXPR ")" BLOCK "else" BLOCK
+    STMT -> "while" "(" EXPR ")" BLOCK
+    BLOCK -> "{" STMTS "}" | "{" "}"
+    EXPR -> EXPR "||" AND | AND
+    AND -> AND "&&" CMP | CMP
+    CMP -> CMP "==" SUM | CMP "!=" SUM | CMP "<" SUM | CMP ">" SUM | SUM
+    SUM -> SUM "+" TERM | SUM "-" TERM | TERM
+    TERM -> TERM "*" UNARY | TERM "/" UNARY | TERM "%" UNARY | UNARY
+    UNARY -> "!" UNARY | "-" UNARY | CALL
+    CALL -> CALL "(" ARGS ")" | CALL "(" ")" | ATOM
+    ARGS -> ARGS "," EXPR | EXPR
+    ATOM -> "(" EXPR ")" | id | int_const | str_const
+    id -> r"([a-zA-Z]|_)([a-zA-Z]|[0-9]|_)*"
+    int_const -> r"0|[1-9][0-9]*"
+    str_const -> r"\\"[^\\"]*\\""
+    """
+
+
+def bench(name: str, fn, repeat: int = 20) -> float:
+    start = perf_counter()
+    for _ in range(repeat):
+        fn()
+    elapsed = (perf_counter() - start) / repeat
+    print("%-24s %8.2fms" % (name, elapsed * 1e3))
+    return elapsed
+
+
+if __name__ == "__main__":
+    start = perf_counter()
+    ld = LangDefBuilder.new(GRAMMAR)
+    print("%-24s %8.2fms" % ("LangDefBuilder.new", (perf_counter() - start) * 1e3))
+    text = json.dumps(ld.to_json())
+    data = ld.to_bytes()
+    print("json %d bytes, binary %d bytes" % (len(text), len(data)))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "lang.ldef")
+        with open(path, "wb") as f:
+            f.write(data)
+        from_json = bench(
+            "LangDef.from_json", lambda: LangDef.from_json(json.loads(text))
+        )
+        from_bytes = bench("LangDef.from_bytes", lambda: LangDef.from_bytes(data))
+        bench("LangDef.from_file", lambda: LangDef.from_file(path))
+    print("speedup: %.1fx" % (from_json / from_bytes))
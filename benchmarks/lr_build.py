@@ -0,0 +1,61 @@
+import sys
+import os
+import json
+from time import perf_counter
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+from cfg_utils.cfg import ContextFreeGrammar  # noqa: E402
+from lr1.action_goto_builder import ActionGotoBuilder  # noqa: E402
+from lr1.lr1_itemset_automata import LRItemSetAutomata  # noqa: E402
+from benchmarks.load import GRAMMAR  # noqa: E402
+
+
+def layered_grammar(levels: int, ops: int) -> str:
+    """
+    An expression grammar with `levels` precedence levels of `ops` binary
+    operators each, i.e. about `levels * (ops + 1)` productions.
+    """
+    lines = ["START -> E0"]
+    for i in range(levels):
+        alternatives = ['E%d "o%d_%d" E%d' % (i, i, j, i + 1) for j in range(ops)]
+        lines.append("E%d -> %s | E%d" % (i, " | ".join(alternatives), i + 1))
+    lines.append('E%d -> "(" E0 ")" | id' % levels)
+    lines.append('id -> r"[a-z]+"')
+    return "\n".join(lines)
+
+
+def bench(cfg: ContextFreeGrammar, mode: str, repeat: int = 3) -> float:
+    start = perf_counter()
+    for _ in range(repeat):
+        automata = LRItemSetAutomata.new(cfg, mode)
+        action, goto = ActionGotoBuilder.new(cfg, automata)
+    elapsed = (perf_counter() - start) / repeat
+    size = len(json.dumps(action.to_json())) + len(json.dumps(goto.to_json()))
+    print(
+        "%-6s %6d states %8.2fms %8d bytes of action/goto json"
+        % (mode, len(automata.item_set_to_id), elapsed * 1e3, size)
+    )
+    return elapsed
+
+
+if __name__ == "__main__":
+    for name, grammar in (
+        ("benchmarks/load.py grammar:", GRAMMAR),
+        ("layered grammar, 30 levels of 6 operators:", layered_grammar(30, 6)),
+    ):
+        print(name)
+        cfg = ContextFreeGrammar.from_string(grammar)
+        lr1 = bench(cfg, "lr1")
+        lalr = bench(cfg, "lalr")
+        pager = bench(cfg, "pager")
+        print("lalr speedup: %.1fx" % (lr1 / lalr))
+        print("pager speedup: %.1fx" % (lr1 / pager))
+
+    cfg = ContextFreeGrammar.from_string(layered_grammar(30, 6))
+    for workers in (1, 2, 4):
+        start = perf_counter()
+        LRItemSetAutomata.new_parallel(cfg, workers)
+        print(
+            "new_parallel, %d workers %8.2fms"
+            % (workers, (perf_counter() - start) * 1e3)
+        )
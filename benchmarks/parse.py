@@ -0,0 +1,127 @@
+import sys
+import os
+from time import perf_counter
+from typing import Any, Dict, Iterable, List, Tuple
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+from lang_def import LangDef  # noqa: E402
+from lang_def_builder import LangDefBuilder  # noqa: E402
+
+
+ld = LangDefBuilder.new(
+    """
+    START -> E
+    E -> E "+" T | E "-" T | T
+    T -> T "*" F | F
+    F -> "(" E ")" | int_const
+    int_const -> r"0|(-?)[1-9][0-9]*"
+    """
+)
+
+
+@ld.production("E -> T", "T -> F", "F -> int_const")
+def __identity(_, e: int) -> int:
+    return e
+
+
+@ld.production('E -> E "+" T')
+def __add(_, e: int, _p: str, t: int) -> int:
+    return e + t
+
+
+@ld.production('E -> E "-" T')
+def __sub(_, e: int, _m: str, t: int) -> int:
+    return e - t
+
+
+@ld.production('T -> T "*" F')
+def __mul(_, t: int, _m: str, f: int) -> int:
+    return t * f
+
+
+@ld.production('F -> "(" E ")"')
+def __par(_, _l, e: int, _r) -> int:
+    return e
+
+
+@ld.production('int_const -> r"0|(-?)[1-9][0-9]*"')
+def __int(_, int_const: str) -> int:
+    return int(int_const)
+
+
+def json_walk_parse(
+    ld: LangDef, tokens: Iterable[Tuple[int, str]], context: Dict[str, Any]
+):
+    # the parser before the integer tables, kept as a baseline
+    state_stack = [0]
+    node_stack: List[Any] = [-1]
+    for token_type, lex_str in tokens:
+        current_state = state_stack[-1]
+        while True:
+            if ld.action_json["table"][current_state].get(str(token_type)) is None:
+                break
+            action_type, next_state = ld.action_json["table"][current_state][
+                str(token_type)
+            ]
+            if action_type == 0:
+                state_stack.append(next_state)
+                node_stack.append(lex_str)
+                break
+            elif action_type == 1:
+                prod_id: int = next_state
+                nargs, non_terminal = ld.prod_id_to_narg_and_non_terminal[str(prod_id)]
+                fn = ld.prod_id_to_fn[str(prod_id)]
+                args = []
+                for _ in range(nargs):
+                    state_stack.pop()
+                    args.append(node_stack.pop())
+                args.append(context)
+                args.reverse()
+                current_state = state_stack[-1]
+                state_stack.append(ld.goto_json["table"][current_state][non_terminal])
+                node_stack.append(fn(*args))
+                current_state = state_stack[-1]
+            else:
+                break
+    return node_stack[-1]
+
+
+def deep_expression(depth: int) -> str:
+    exp = "1"
+    for i in range(depth):
+        exp = "(%s %s %d)" % (exp, "+-*"[i % 3], i % 7)
+    return exp
+
+
+def bench(name: str, fn, tokens: List[Tuple[int, str]], repeat: int) -> float:
+    start = perf_counter()
+    for _ in range(repeat):
+        result = fn(tokens)
+    elapsed = perf_counter() - start
+    print("%-16s %8.3fs  result %d" % (name, elapsed, result))
+    return elapsed
+
+
+def bench_throughput(name: str, fn, inputs: List[str]) -> float:
+    start = perf_counter()
+    results = fn(inputs)
+    elapsed = perf_counter() - start
+    print(
+        "%-16s %8.3fs  %8.0f inputs/s  checksum %d"
+        % (name, elapsed, len(inputs) / elapsed, sum(results))
+    )
+    return elapsed
+
+
+if __name__ == "__main__":
+    print("deep expression:")
+    tokens = list(ld.scan(deep_expression(500)))
+    baseline = bench("json walk", lambda t: json_walk_parse(ld, t, {}), tokens, 200)
+    table = bench("LangDef.parse", lambda t: ld.parse(t, {}), tokens, 200)
+    print("speedup: %.1fx" % (baseline / table))
+
+    print("many short expressions:")
+    inputs = ["%d * (%d + %d) - %d" % (i, i % 7, i % 11, i % 13) for i in range(50000)]
+    loop = bench_throughput("eval loop", lambda l: [ld.eval(s, {}) for s in l], inputs)
+    many = bench_throughput("LangDef.eval_many", ld.eval_many, inputs)
+    print("speedup: %.1fx" % (loop / many))
@@ -0,0 +1,113 @@
+import sys
+import os
+import tracemalloc
+from time import perf_counter
+from typing import Tuple
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+from dfa_utils.array_automata import ArrayAutomata  # noqa: E402
+from dfa_utils.finite_automata import FiniteAutomata  # noqa: E402
+from dfa_utils.finite_automata_node import (  # noqa: E402
+    EpsilonTransition,
+    FiniteAutomataNode,
+)
+from dfa_utils.finite_automata_set import FiniteAutomataSet  # noqa: E402
+
+
+REGEXES = {
+    "string literal": r"\"[^\"]*\"",
+    "identifier": "([a-zA-Z]|_)([a-zA-Z]|[0-9]|_)*",
+    "block comment": r"/\*([^*]|\*+[^*/])*\*+/",
+    "line comment": r"//[^\n]*",
+    "mixed classes": r"[^\"]*x|[^a-z]+[^0-9]*y|([a-f]|[0-9])+z",
+}
+
+# the token classes of a small C-like language
+KEYWORDS = (
+    "if else while for do return break continue switch case default struct enum "
+    "union typedef const static extern void char short int long float double "
+    "signed unsigned sizeof goto"
+).split()
+SYMBOLS = (
+    "( ) [ ] { } ; , . -> ++ -- + - * / % & | ^ ~ ! << >> < > <= >= == != && || "
+    "= += -= *= /= %= &= |= ^= <<= >>= ? :"
+).split()
+TOKEN_REGEXES = list(REGEXES.values())[:4] + [
+    "0|[1-9][0-9]*",
+    "0x([0-9]|[a-f]|[A-F])+",
+    "[0-9]+\\.[0-9]*",
+    "'([^'\\\\]|\\\\.)'",
+]
+
+
+def graph_scanner() -> FiniteAutomata:
+    # what FiniteAutomataSet did before it was built on ArrayAutomata
+    start = FiniteAutomataNode()
+    accept_states = set()
+    automata = [FiniteAutomata.from_literal(s) for s in KEYWORDS + SYMBOLS] + [
+        FiniteAutomata.from_string(r, minimize=True) for r in TOKEN_REGEXES
+    ]
+    for i, fa in enumerate(automata):
+        start.add_edge(EpsilonTransition(), fa.start_node)
+        for accept_state in fa.accept_states:
+            accept_state.fa_id = i
+            accept_states.add(accept_state)
+    return FiniteAutomata(start, accept_states).determinize().hopcroft_minimize()
+
+
+def array_scanner() -> FiniteAutomataSet:
+    return FiniteAutomataSet(
+        [ArrayAutomata.from_literal(s) for s in KEYWORDS + SYMBOLS]
+        + [
+            ArrayAutomata.from_fa(FiniteAutomata.from_string(r)).minimize()
+            for r in TOKEN_REGEXES
+        ]
+    )
+
+
+def memory(fn) -> Tuple[int, int]:
+    """
+    Bytes still held by the result of `fn`, and peak bytes while running it.
+    """
+    tracemalloc.start()
+    result = fn()
+    held, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return held, peak
+
+
+def bench(name: str, fn, repeat: int = 50) -> float:
+    # best of `repeat`, the mean is too noisy for runs this short
+    elapsed = float("inf")
+    for _ in range(repeat):
+        start = perf_counter()
+        fn()
+        elapsed = min(elapsed, perf_counter() - start)
+    print("%-32s %8.3fms" % (name, elapsed * 1e3))
+    return elapsed
+
+
+if __name__ == "__main__":
+    for name, regex in REGEXES.items():
+        nfa = FiniteAutomata.from_string(regex)
+        bench("%s (dfa)" % name, nfa.determinize)
+        bench(
+            "%s (min dfa)" % name,
+            lambda: FiniteAutomata.from_string(regex, minimize=True),
+        )
+        bench(
+            "%s (array min dfa)" % name,
+            lambda: ArrayAutomata.from_fa(FiniteAutomata.from_string(regex)).minimize(),
+        )
+
+    print("%d token classes:" % (len(KEYWORDS) + len(SYMBOLS) + len(TOKEN_REGEXES)))
+    graph = bench("graph scanner", graph_scanner, 20)
+    array = bench("array scanner", array_scanner, 20)
+    print("speedup: %.1fx" % (graph / array))
+    for name, fn in (("graph", graph_scanner), ("array", array_scanner)):
+        held, peak = memory(fn)
+        print(
+            "%s scanner memory: %6.0f KiB held, %6.0f KiB peak"
+            % (name, held / 1024, peak / 1024)
+        )
@@ -0,0 +1,93 @@
+import sys
+import os
+from collections import deque
+from time import perf_counter
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+from cfg_utils.type_def import TypeDefinition  # noqa: E402
+from lang_def import LangDef  # noqa: E402
+
+
+typedef = TypeDefinition()
+for keyword in ("select", "from", "where", "and", "or"):
+    typedef.add_definition(keyword)
+for symbol in (",", ".", "*", "==", "!=", "<", ">", "(", ")"):
+    typedef.add_definition(symbol)
+typedef.add_definition(r"\"[^\"]*\"", True)
+typedef.add_definition("(-?)(0|[1-9][0-9]*)", True)
+typedef.add_definition("([a-zA-Z]|_)([a-zA-Z]|[0-9]|_)*", True)
+
+ld = LangDef(typedef.get_dfa_set().to_json(), {}, {}, {}, {})
+# the same scanner with the byte level tables, for bytes input
+utf8_ld = LangDef(
+    typedef.get_dfa_set().to_json(),
+    {},
+    {},
+    {},
+    {},
+    typedef.get_dfa_set(utf8=True).to_json(),
+)
+# whitespace as a skipped pattern of the DFA, instead of skipped between tokens
+typedef.add_definition(r"\s+", True, skip=True)
+skip_ld = LangDef(
+    typedef.get_dfa_set().to_json(), {}, {}, {}, {}, skip_ids=typedef.skip_ids
+)
+
+text = (
+    'select * from whatever where column1 != column2 and (column4 == "some literal"'
+    " or column3 < 5)\n"
+) * 5000
+
+
+def json_walk_scan(s: str):
+    # the scanner before the dense transition table, kept as a baseline
+    deque_s = deque(s)
+    while deque_s:
+        (id, word) = LangDef.match_one(ld.dfa_set_json, deque_s)
+        if word:
+            yield id, word
+        elif deque_s:
+            deque_s.popleft()
+        while deque_s and deque_s[0] in {" ", "\t", "\n"}:
+            deque_s.popleft()
+    yield -1, "$"
+
+
+# the same query with non-ASCII string literals, whose chars go through bisect
+unicode_text = text.replace("some literal", "\u00e9t\u00e9 \u4e2d\u6587 \U0001f600")
+
+
+# every token reads to the end of the input hoping for "b", then falls back to "a"
+backtrack_typedef = TypeDefinition()
+backtrack_typedef.add_definition("a")
+backtrack_typedef.add_definition("a*b", True)
+backtrack_ld = LangDef(backtrack_typedef.get_dfa_set().to_json(), {}, {}, {}, {})
+backtrack_text = "a" * 4000
+
+
+def bench(name: str, fn, text: str = text) -> float:
+    start = perf_counter()
+    tokens = sum(1 for _ in fn(text))
+    elapsed = perf_counter() - start
+    print(
+        "%-20s %8d tokens %8.3fs %8.2f MB/s"
+        % (name, tokens, elapsed, len(text) / elapsed / 1e6)
+    )
+    return elapsed
+
+
+if __name__ == "__main__":
+    baseline = bench("json walk", json_walk_scan)
+    table = bench("LangDef.scan", ld.scan)
+    bench("LangDef.scan_spans", ld.scan_spans)
+    bench("scan_spans, unicode", ld.scan_spans, unicode_text)
+    bench("skip pattern", skip_ld.scan_spans)
+    for label, source in (("ascii", text), ("unicode", unicode_text)):
+        data = source.encode()
+        bench("decoding, %s" % label, ld.scan_bytes_spans, data)
+        bench("byte table, %s" % label, utf8_ld.scan_bytes_spans, data)
+    print("speedup: %.1fx" % (baseline / table))
+    plain = bench("backtracking", backtrack_ld.scan_spans, backtrack_text)
+    backtrack_ld.SCAN_MEMOIZE = True
+    memoized = bench("memoized", backtrack_ld.scan_spans, backtrack_text)
+    print("speedup: %.1fx" % (plain / memoized))
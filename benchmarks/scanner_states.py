@@ -0,0 +1,95 @@
+import sys
+import os
+import ast
+from time import perf_counter
+from typing import Iterator, List, Tuple
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+from cfg_utils.cfg import ContextFreeGrammar  # noqa: E402
+from cfg_utils.type_def import TypeDefinition  # noqa: E402
+from dfa_utils.finite_automata import FiniteAutomata  # noqa: E402
+from dfa_utils.finite_automata_set import FiniteAutomataSet  # noqa: E402
+from examples.calc_parallel import GRAMMAR as CALC_GRAMMAR  # noqa: E402
+from benchmarks.load import GRAMMAR as LOAD_GRAMMAR  # noqa: E402
+
+TESTS = os.path.join(os.path.dirname(os.path.dirname(__file__)), "tests")
+
+
+def typedefs_in_tests(path: str) -> Iterator[Tuple[str, TypeDefinition]]:
+    """
+    The scanners built by the tests in `path`: the `add_definition` calls of
+    each test function, and every grammar literal passed to `LangDefBuilder.new`.
+    """
+    with open(path, encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    for func in tree.body:
+        if not isinstance(func, ast.FunctionDef):
+            continue
+        typedef = TypeDefinition()
+        for node in ast.walk(func):
+            if not isinstance(node, ast.Call) or not isinstance(
+                node.func, ast.Attribute
+            ):
+                continue
+            args = [arg.value for arg in node.args if isinstance(arg, ast.Constant)]
+            if len(args) != len(node.args) or not args:
+                continue
+            if node.func.attr == "add_definition":
+                typedef.add_definition(*args)
+            elif node.func.attr == "new" and isinstance(args[0], str):
+                yield func.name, ContextFreeGrammar.from_string(args[0]).typedef
+        if typedef.patterns:
+            yield func.name, typedef
+
+
+def scanner_dfas(typedef: TypeDefinition) -> List[FiniteAutomata]:
+    return [
+        typedef.dfa_cache.get(pattern)
+        if is_regex
+        else FiniteAutomata.from_literal(pattern)
+        for pattern, is_regex in typedef.patterns
+    ]
+
+
+def bench(name: str, typedef: TypeDefinition) -> Tuple[int, int]:
+    start = perf_counter()
+    determinized = FiniteAutomataSet(scanner_dfas(typedef), minimize=False)
+    middle = perf_counter()
+    minimized = FiniteAutomataSet(scanner_dfas(typedef))
+    end = perf_counter()
+    before = determinized.to_json()["num_node"]
+    after = minimized.to_json()["num_node"]
+    print(
+        "%-40s %5d -> %5d states (%5.1f%%) %8.2fms -> %8.2fms"
+        % (
+            name,
+            before,
+            after,
+            100 * (before - after) / before,
+            (middle - start) * 1e3,
+            (end - middle) * 1e3,
+        )
+    )
+    return before, after
+
+
+if __name__ == "__main__":
+    cases = list(typedefs_in_tests(os.path.join(TESTS, "test_langdef.py")))
+    for name, grammar in (
+        ("examples.calc_parallel", CALC_GRAMMAR),
+        ("benchmarks.load", LOAD_GRAMMAR),
+    ):
+        cases.append((name, ContextFreeGrammar.from_string(grammar).typedef))
+    total_before = total_after = 0
+    for name, typedef in cases:
+        before, after = bench(name, typedef)
+        total_before += before
+        total_after += after
+    print(
+        "total: %d -> %d states (%.1f%% fewer)"
+        % (
+            total_before,
+            total_after,
+            100 * (total_before - total_after) / total_before,
+        )
+    )
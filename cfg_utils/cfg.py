@@ -10,8 +10,13 @@ class ContextFreeGrammar:
     The cfg parser will first split input to python tuples,
     record both nonTerminals and all symbols, and give ID to each production.
     Then using terminals = allSymbols - nonTerminals, we can get terminals.
+
+    Lines of the form `%skip -> r"\\s+" | r"#[^\\n]*"` are not productions. They
+    declare patterns that the scanner matches and then drops, see
+    `TypeDefinition.add_definition`.
     """
 
+    SKIP = "%skip"
     SUBSTITUTE = "_"
     EOF = -1
     EMPTY = ""
@@ -40,12 +45,16 @@ class ContextFreeGrammar:
         start_symbol = None
 
         temp: List[Tuple[str, List[str]]] = []
+        skip_patterns: List[str] = []
 
         for line in string.split("\n"):
             line = line.strip()
             if not line:
                 continue
             non_terminal, seqs = line.split(" -> ")
+            if non_terminal == cls.SKIP:
+                skip_patterns.extend(seqs.split(" | "))
+                continue
 
             if start_symbol is None:
                 start_symbol = non_terminal
@@ -69,7 +78,9 @@ class ContextFreeGrammar:
             line = line.strip()
             if not line:
                 continue
-            _, seqs = line.split(" -> ")
+            non_terminal, seqs = line.split(" -> ")
+            if non_terminal == cls.SKIP:
+                continue
 
             for seq in seqs.split(" | "):
                 symbols = seq.split(" ")
@@ -78,6 +89,8 @@ class ContextFreeGrammar:
                         processed_terminal, is_regex = cls.parse_terminal(symbol)
                         typedef.add_definition(processed_terminal, is_regex)
                         terminals.add(processed_terminal)
+        for pattern in skip_patterns:
+            typedef.add_definition(*cls.parse_terminal(pattern), skip=True)
 
         for i, (non_terminal, symbols) in enumerate(temp):
             symbols = tuple(
@@ -310,45 +323,43 @@ class ContextFreeGrammar:
             result.discard(self.EMPTY)
         return has_empty
 
-    def update_non_terminal_first_set(
-        self, result: Dict[str, Set[str | int]], non_terminal: str
-    ) -> bool:
-        nt_has_empty = False
-        for id_ in self.get_productions(non_terminal):
-            has_non_terminal = False
-            all_non_terminal_has_empty = True
-            for sym in self.get_production(id_)[1]:
-                if self.is_terminal(sym):
-                    result[non_terminal].add(sym)
-                    break
-                elif self.is_non_terminal(sym):
-                    assert isinstance(sym, str)
-                    has_non_terminal = True
-                    if sym != non_terminal:
-                        all_non_terminal_has_empty &= (
-                            self.update_non_terminal_first_set(result, sym)
-                        )
-                        result[non_terminal] |= result[sym]
-                        if not all_non_terminal_has_empty:
-                            break
-                    else:
-                        break
-                elif sym == self.EMPTY:
-                    nt_has_empty = True
-                    break
-            nt_has_empty |= has_non_terminal and all_non_terminal_has_empty
-        if nt_has_empty:
-            result[non_terminal].add(self.EMPTY)
-        else:
-            result[non_terminal].discard(self.EMPTY)
-        return nt_has_empty
-
-    def first(self) -> dict:
+    def first(self, known: Optional[Dict[str, Set[str | int]]] = None) -> dict:
         """
-        Calculate the first set of a given cfg
+        Calculate the first set of a given cfg. EMPTY is in the first set of
+        every non-terminal that can derive EMPTY.
+
+        Iterates over all productions until no first set grows, which handles
+        left recursion and non-terminals that reach themselves through
+        nullable prefixes.
+
+        Non-terminals in `known` take the given first sets as they are, which
+        lets a caller reuse the first sets of an earlier version of the grammar.
         """
-        result = {k: set() for k in self.non_terminals}
-        for non, _ in self.non_terminal_to_prod_id.items():
-            if not result[non]:
-                self.update_non_terminal_first_set(result, non)
+        known = known or {}
+        result = {k: set(known.get(k, ())) for k in self.non_terminals}
+        changed = True
+        while changed:
+            changed = False
+            for non_terminal, ids in self.non_terminal_to_prod_id.items():
+                if non_terminal in known:
+                    continue
+                for id_ in ids:
+                    first = set()
+                    nullable = True
+                    for sym in self.get_production(id_)[1]:
+                        if self.is_non_terminal(sym):
+                            first |= result[sym]
+                            if self.EMPTY not in result[sym]:
+                                nullable = False
+                                break
+                        elif sym != self.EMPTY:
+                            first.add(sym)
+                            nullable = False
+                            break
+                    first.discard(self.EMPTY)
+                    if nullable:
+                        first.add(self.EMPTY)
+                    if not first <= result[non_terminal]:
+                        result[non_terminal] |= first
+                        changed = True
         return result
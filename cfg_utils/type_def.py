@@ -1,6 +1,7 @@
-from typing import List, Tuple, Dict
+from typing import List, Set, Tuple, Dict
 
-from dfa_utils.finite_automata import FiniteAutomata
+from dfa_utils.array_automata import ArrayAutomata
+from dfa_utils.dfa_cache import MinDfaCache
 from dfa_utils.finite_automata_set import FiniteAutomataSet
 
 
@@ -9,30 +10,47 @@ class TypeDefinition:
     A helper class that stores patterns / regexes and their corresponding id
     """
 
+    # shared by all instances, replace it to change bounds or enable the disk cache
+    dfa_cache = MinDfaCache()
+
     def __init__(self):
         self.patterns: List[Tuple[str, bool]] = []  # (is_regex, pattern)
         self.pattern_to_id: Dict[str, int] = {}  # map name to integer id
+        self.skip_ids: Set[int] = set()  # ids of patterns whose matches are discarded
 
     def __str__(self):
         return str(self.patterns) + "\n" + str(self.pattern_to_id)
 
-    def add_definition(self, pattern: str, is_regex: bool = False):
+    def add_definition(self, pattern: str, is_regex: bool = False, skip: bool = False):
+        """
+        Add `pattern` if it's new. With `skip`, what it matches is scanned like any
+        other token, e.g. to find where a comment ends, and then dropped.
+        """
         # in order to take less memory and have faster process speed,
         # map string to int.
         if pattern not in self.pattern_to_id:
             self.pattern_to_id[pattern] = len(self.pattern_to_id)
             self.patterns.append((pattern, is_regex))
-
-    def get_dfa_set(self) -> FiniteAutomataSet:
+            if skip:
+                self.skip_ids.add(self.pattern_to_id[pattern])
+        elif skip != (self.pattern_to_id[pattern] in self.skip_ids):
+            raise ValueError("%r can't be both a token and skipped" % pattern)
+
+    def get_dfa_set(self, utf8: bool = False) -> FiniteAutomataSet:
+        """
+        The scanner DFA of all patterns, over code points, or over the bytes of
+        UTF-8 encoded input if `utf8` is True.
+        """
         return FiniteAutomataSet(
             list(
                 map(
-                    lambda r: FiniteAutomata.from_string(r[0], minimize=True)
+                    lambda r: self.dfa_cache.get_array(r[0])
                     if r[1]
-                    else FiniteAutomata.from_literal(r[0]),
+                    else ArrayAutomata.from_literal(r[0]),
                     self.patterns,
                 )
-            )
+            ),
+            utf8=utf8,
         )
 
     def get_pattern_id(self, pattern: str) -> int:
@@ -0,0 +1,522 @@
+from array import array
+from bisect import bisect_right
+from collections import deque
+from typing import Any, Deque, Dict, Iterable, List, Optional, Self, Set, Tuple
+
+from io_utils.to_json import ToJson
+from io_utils.from_json import FromJson
+from .finite_automata import FiniteAutomata
+from .finite_automata_node import (
+    EpsilonTransition,
+    FiniteAutomataNode,
+    Transition,
+)
+from .utf8 import utf8_sequences
+
+
+def _members(bits: int) -> Iterable[int]:
+    while bits:
+        low = bits & -bits
+        yield low.bit_length() - 1
+        bits ^= low
+
+
+class ArrayAutomata(ToJson, FromJson):
+    """
+    A finite automaton stored in flat arrays instead of a graph of
+    `FiniteAutomataNode`s.
+
+    Nodes are ints in range(num_node). Edge k goes from src[k] to dst[k] on the
+    characters in range(lo[k], hi[k]), or is an ϵ edge if lo[k] == EPSILON. The
+    ranges of one `Transition` are consecutive edges with the same src and dst.
+    fa_id[i] is the `FiniteAutomataNode.fa_id` of node i, NO_FA_ID for None, and
+    node i is an accept state iff accept[i].
+
+    `to_json` and `from_json` use the same format as `FiniteAutomata`.
+    """
+
+    EPSILON = -1
+    NO_FA_ID = -1
+
+    def __init__(
+        self,
+        num_node: int,
+        start: int,
+        src: array,
+        lo: array,
+        hi: array,
+        dst: array,
+        fa_id: array,
+        accept: bytearray,
+    ) -> None:
+        self.num_node = num_node
+        self.start = start
+        self.src = src
+        self.lo = lo
+        self.hi = hi
+        self.dst = dst
+        self.fa_id = fa_id
+        self.accept = accept
+
+    @classmethod
+    def empty(cls, num_node: int = 0, start: int = 0) -> Self:
+        return cls(
+            num_node,
+            start,
+            array("i"),
+            array("i"),
+            array("i"),
+            array("i"),
+            array("i", [cls.NO_FA_ID]) * num_node,
+            bytearray(num_node),
+        )
+
+    def add_node(self, fa_id: Optional[int] = None, accept: bool = False) -> int:
+        self.fa_id.append(self.NO_FA_ID if fa_id is None else fa_id)
+        self.accept.append(accept)
+        self.num_node += 1
+        return self.num_node - 1
+
+    def add_edge(self, src: int, lo: int, hi: int, dst: int) -> None:
+        self.src.append(src)
+        self.lo.append(lo)
+        self.hi.append(hi)
+        self.dst.append(dst)
+
+    def add_transition(self, src: int, cond: Transition, dst: int) -> None:
+        if not cond.ranges:
+            self.add_edge(src, self.EPSILON, self.EPSILON, dst)
+        for r in cond.ranges:
+            if r:
+                self.add_edge(src, r.start, r.stop, dst)
+
+    def out_edges(self) -> Tuple[List[int], List[int]]:
+        """
+        Edge indices sorted by src, keeping the order of the edges of each node,
+        and offsets such that the edges of node i are
+        order[offsets[i] : offsets[i + 1]].
+        """
+        offsets = [0] * (self.num_node + 1)
+        for s in self.src:
+            offsets[s + 1] += 1
+        for i in range(self.num_node):
+            offsets[i + 1] += offsets[i]
+        order = [0] * len(self.src)
+        fill = offsets[:-1]
+        for k, s in enumerate(self.src):
+            order[fill[s]] = k
+            fill[s] += 1
+        return order, offsets
+
+    def transitions(
+        self, order: List[int], offsets: List[int], node: int
+    ) -> Iterable[Tuple[Transition, int]]:
+        """
+        (Transition, dst) of `node`, with consecutive edges to the same dst
+        merged back into one `Transition`.
+        """
+        edges = order[offsets[node] : offsets[node + 1]]
+        ranges: List[range] = []
+        for n, k in enumerate(edges):
+            if self.lo[k] == self.EPSILON:
+                yield EpsilonTransition(), self.dst[k]
+                continue
+            ranges.append(range(self.lo[k], self.hi[k]))
+            if (
+                n + 1 == len(edges)
+                or self.dst[edges[n + 1]] != self.dst[k]
+                or self.lo[edges[n + 1]] == self.EPSILON
+            ):
+                yield Transition(*ranges), self.dst[k]
+                ranges = []
+
+    @classmethod
+    def from_fa(cls, fa: FiniteAutomata) -> Self:
+        node_id: Dict[FiniteAutomataNode, int] = {fa.start_node: 0}
+        nodes: List[FiniteAutomataNode] = [fa.start_node]
+        result = cls.empty()
+        for i, node in enumerate(nodes):  # grows while iterating, i.e. a bfs
+            result.add_node(node.fa_id, node in fa.accept_states)
+            for cond, nxt in node.successors:
+                if nxt not in node_id:
+                    node_id[nxt] = len(nodes)
+                    nodes.append(nxt)
+                result.add_transition(i, cond, node_id[nxt])
+        return result
+
+    def to_fa(self) -> FiniteAutomata:
+        nodes = [
+            FiniteAutomataNode(fa_id=None if fa_id == self.NO_FA_ID else fa_id)
+            for fa_id in self.fa_id
+        ]
+        order, offsets = self.out_edges()
+        for i, node in enumerate(nodes):
+            for cond, dst in self.transitions(order, offsets, i):
+                node.add_edge(cond, nodes[dst])
+        return FiniteAutomata(
+            nodes[self.start],
+            {nodes[i] for i in range(self.num_node) if self.accept[i]},
+        )
+
+    @classmethod
+    def from_literal(cls, literal: str) -> Self:
+        result = cls.empty(len(literal) + 1)
+        for i, c in enumerate(literal):
+            result.add_edge(i, ord(c), ord(c) + 1, i + 1)
+        result.accept[len(literal)] = True
+        return result
+
+    @classmethod
+    def union(cls, automata: Iterable[Self]) -> Self:
+        """
+        ϵ-join `automata` under a new start node 0.
+        """
+        result = cls.empty(1)
+        for a in automata:
+            offset = result.num_node
+            result.add_edge(0, cls.EPSILON, cls.EPSILON, a.start + offset)
+            result.src.extend(s + offset for s in a.src)
+            result.lo.extend(a.lo)
+            result.hi.extend(a.hi)
+            result.dst.extend(d + offset for d in a.dst)
+            result.fa_id.extend(a.fa_id)
+            result.accept.extend(a.accept)
+            result.num_node += a.num_node
+        return result
+
+    def set_accept_fa_id(self, fa_id: int) -> None:
+        for i in range(self.num_node):
+            if self.accept[i]:
+                self.fa_id[i] = fa_id
+
+    def to_utf8(self) -> Self:
+        """
+        The same automaton over the bytes of the UTF-8 encoding of its input,
+        i.e. every edge on code points becomes paths of edges on bytes 0 to 0xFF,
+        through new intermediate nodes. The result is usually an NFA, since
+        different code point ranges may share leading bytes.
+        """
+        result = type(self)(
+            self.num_node,
+            self.start,
+            array("i"),
+            array("i"),
+            array("i"),
+            array("i"),
+            array("i", self.fa_id),
+            bytearray(self.accept),
+        )
+        for k in range(len(self.src)):
+            if self.lo[k] == self.EPSILON:
+                result.add_edge(self.src[k], self.EPSILON, self.EPSILON, self.dst[k])
+                continue
+            for seq in utf8_sequences(self.lo[k], self.hi[k] - 1):
+                cur = self.src[k]
+                for lo, hi in seq[:-1]:
+                    nxt = result.add_node()
+                    result.add_edge(cur, lo, hi + 1, nxt)
+                    cur = nxt
+                result.add_edge(cur, seq[-1][0], seq[-1][1] + 1, self.dst[k])
+        return result
+
+    def determinize(self) -> Self:
+        """
+        Subset construction, see `FiniteAutomata.determinize`. DFA states are
+        numbered in bfs order from the start state 0.
+        """
+        order, offsets = self.out_edges()
+        closures: List[int] = [0] * self.num_node
+        for i in range(self.num_node - 1, -1, -1):
+            # a finished closure already holds everything reachable from it
+            closure = 1 << i
+            stack = [i]
+            while stack:
+                cur = stack.pop()
+                for k in order[offsets[cur] : offsets[cur + 1]]:
+                    j = self.dst[k]
+                    if self.lo[k] != self.EPSILON or closure >> j & 1:
+                        continue
+                    if closures[j]:
+                        closure |= closures[j]
+                    else:
+                        closure |= 1 << j
+                        stack.append(j)
+            closures[i] = closure
+
+        # (start, stop, ϵ closure of the target) of every non-ϵ edge of a node
+        edges: List[List[Tuple[int, int, int]]] = [
+            [
+                (self.lo[k], self.hi[k], closures[self.dst[k]])
+                for k in order[offsets[i] : offsets[i + 1]]
+                if self.lo[k] != self.EPSILON and self.lo[k] < self.hi[k]
+            ]
+            for i in range(self.num_node)
+        ]
+        accept_bits = 0
+        for i in range(self.num_node):
+            if self.accept[i]:
+                accept_bits |= 1 << i
+
+        result = type(self).empty()
+        state_of: Dict[int, int] = {}
+        que: Deque[int] = deque()
+
+        def intern(bits: int) -> int:
+            state = state_of.get(bits)
+            if state is None:
+                fa_ids = [
+                    self.fa_id[i]
+                    for i in _members(bits)
+                    if self.fa_id[i] != self.NO_FA_ID
+                ]
+                state = result.add_node(
+                    min(fa_ids) if fa_ids else None, bool(bits & accept_bits)
+                )
+                state_of[bits] = state
+                que.append(bits)
+            return state
+
+        intern(closures[self.start])
+        while que:
+            bits = que.popleft()
+            events: List[Tuple[int, int, int]] = []
+            for i in _members(bits):
+                for k, (start, stop, _) in enumerate(edges[i]):
+                    events.append((start, i, k))
+                    events.append((stop, i, ~k))
+            events.sort()
+            active: Dict[Tuple[int, int], int] = {}
+            ranges_by_target: Dict[int, List[Tuple[int, int]]] = {}
+            for e, (pos, i, k) in enumerate(events):
+                if k >= 0:
+                    active[i, k] = edges[i][k][2]
+                else:
+                    del active[i, ~k]
+                if e + 1 < len(events) and events[e + 1][0] != pos and active:
+                    target = 0
+                    for closure in active.values():
+                        target |= closure
+                    ranges_by_target.setdefault(target, []).append(
+                        (pos, events[e + 1][0])
+                    )
+            state = state_of[bits]
+            for target, ranges in ranges_by_target.items():
+                dst = intern(target)
+                for start, stop in ranges:
+                    result.add_edge(state, start, stop, dst)
+        return result
+
+    def hopcroft_minimize(self) -> Self:
+        """
+        Minimize this DFA, see `FiniteAutomata.hopcroft_minimize`. The states of
+        the result are numbered in bfs order from the start state 0.
+
+        Unlike there, missing transitions aren't completed with a dead state.
+        States that can't reach an accept state are dropped instead, and every
+        block of the initial partition is used as a splitter, which is what
+        partition refinement needs for a partial DFA. This keeps the dead state,
+        with its incoming edges from nearly every state on nearly every letter,
+        out of the refinement.
+        """
+        order, offsets = self.out_edges()
+        nodes: List[int] = [self.start]
+        node_id: Dict[int, int] = {self.start: 0}
+        preds: List[List[int]] = [[]]
+        for i, cur in enumerate(nodes):  # grows while iterating, i.e. a bfs
+            for k in order[offsets[cur] : offsets[cur + 1]]:
+                assert self.lo[k] != self.EPSILON, "hopcroft_minimize needs a DFA"
+                if self.dst[k] not in node_id:
+                    node_id[self.dst[k]] = len(nodes)
+                    nodes.append(self.dst[k])
+                    preds.append([])
+                preds[node_id[self.dst[k]]].append(i)
+
+        live = [False] * len(nodes)
+        stack = [i for i, cur in enumerate(nodes) if self.accept[cur]]
+        for i in stack:
+            live[i] = True
+        while stack:
+            for i in preds[stack.pop()]:
+                if not live[i]:
+                    live[i] = True
+                    stack.append(i)
+        if not live[0]:
+            result = type(self).empty()
+            result.add_node(None, False)
+            return result
+        nodes = [cur for i, cur in enumerate(nodes) if live[i]]
+        node_id = {cur: i for i, cur in enumerate(nodes)}
+
+        edges = [
+            (self.lo[k], self.hi[k], node_id[self.dst[k]])
+            for cur in nodes
+            for k in order[offsets[cur] : offsets[cur + 1]]
+            if self.dst[k] in node_id
+        ]
+        bounds = sorted({bound for lo, hi, _ in edges for bound in (lo, hi)})
+        # delta[state][column], column c is range(bounds[c], bounds[c + 1]), and
+        # -1 where there's no transition
+        delta = [[-1] * (len(bounds) - 1) for _ in nodes]
+        for i, cur in enumerate(nodes):
+            for k in order[offsets[cur] : offsets[cur + 1]]:
+                if self.dst[k] not in node_id:
+                    continue
+                start = bisect_right(bounds, self.lo[k]) - 1
+                stop = bisect_right(bounds, self.hi[k]) - 1
+                delta[i][start:stop] = [node_id[self.dst[k]]] * (stop - start)
+
+        # columns that every state maps alike are a single letter to the
+        # refinement, incoming[j] is the (letter, i) of every i -> j
+        letter_id: Dict[Tuple[int, ...], int] = {}
+        letter_of = [
+            letter_id.setdefault(column, len(letter_id)) for column in zip(*delta)
+        ]
+        incoming: List[List[Tuple[int, int]]] = [[] for _ in nodes]
+        for i, row in enumerate(delta):
+            for a, j in dict.fromkeys(zip(letter_of, row)):
+                if j != -1:
+                    incoming[j].append((a, i))
+
+        groups: Dict[Tuple[int, int], List[int]] = {}
+        for i, cur in enumerate(nodes):
+            groups.setdefault((self.accept[cur], self.fa_id[cur]), []).append(i)
+        blocks: List[Set[int]] = [set(group) for group in groups.values()]
+        block_of = [0] * len(nodes)
+        for b, block in enumerate(blocks):
+            for i in block:
+                block_of[i] = b
+
+        waiting = set(range(len(blocks)))
+        while waiting:
+            by_letter: Dict[int, List[int]] = {}
+            for j in blocks[waiting.pop()]:
+                for a, i in incoming[j]:
+                    by_letter.setdefault(a, []).append(i)
+            for preimage in by_letter.values():
+                touched: Dict[int, Set[int]] = {}
+                for i in preimage:
+                    touched.setdefault(block_of[i], set()).add(i)
+                for b, part in touched.items():
+                    if len(part) == len(blocks[b]):
+                        continue
+                    blocks[b] -= part
+                    blocks.append(part)
+                    new_b = len(blocks) - 1
+                    for i in part:
+                        block_of[i] = new_b
+                    if b in waiting or len(part) <= len(blocks[b]):
+                        waiting.add(new_b)
+                    else:
+                        waiting.add(b)
+
+        result = type(self).empty()
+        new_id: Dict[int, int] = {}
+        que: Deque[int] = deque()
+
+        def visit(b: int) -> int:
+            if b not in new_id:
+                cur = nodes[next(iter(blocks[b]))]
+                new_id[b] = result.add_node(
+                    None if self.fa_id[cur] == self.NO_FA_ID else self.fa_id[cur],
+                    bool(self.accept[cur]),
+                )
+                que.append(b)
+            return new_id[b]
+
+        visit(block_of[0])
+        while que:
+            b = que.popleft()
+            ranges_by_target: Dict[int, List[Tuple[int, int]]] = {}
+            cur = nodes[next(iter(blocks[b]))]
+            for k in order[offsets[cur] : offsets[cur + 1]]:
+                if self.dst[k] not in node_id:
+                    continue
+                target = block_of[node_id[self.dst[k]]]
+                ranges = ranges_by_target.setdefault(target, [])
+                if ranges and ranges[-1][1] == self.lo[k]:
+                    ranges[-1] = (ranges[-1][0], self.hi[k])
+                else:
+                    ranges.append((self.lo[k], self.hi[k]))
+            for target, ranges in ranges_by_target.items():
+                dst = visit(target)
+                for start, stop in ranges:
+                    result.add_edge(new_id[b], start, stop, dst)
+        return result
+
+    def minimize(self) -> Self:
+        return self.determinize().hopcroft_minimize()
+
+    def match_first(self, s: Iterable[str]) -> str:
+        """
+        The longest prefix of `s` this DFA accepts, like
+        `FiniteAutomata.match_first`.
+        """
+        order, offsets = self.out_edges()
+        cur = self.start
+        buffer: List[str] = []
+        accepted = 0
+        for c in s:
+            if self.accept[cur]:
+                accepted = len(buffer)
+            code = ord(c)
+            for k in order[offsets[cur] : offsets[cur + 1]]:
+                if self.lo[k] <= code < self.hi[k]:
+                    buffer.append(c)
+                    cur = self.dst[k]
+                    break
+            else:
+                break
+        if self.accept[cur]:
+            accepted = len(buffer)
+        return "".join(buffer[:accepted])
+
+    def to_json(self):
+        order, offsets = self.out_edges()
+        # number the nodes in the same dfs preorder as `FiniteAutomataNode.dfs`
+        node_id: Dict[int, int] = {self.start: 0}
+        preorder: List[int] = [self.start]
+        stack = [iter(order[offsets[self.start] : offsets[self.start + 1]])]
+        while stack:
+            for k in stack[-1]:
+                nxt = self.dst[k]
+                if nxt not in node_id:
+                    node_id[nxt] = len(preorder)
+                    preorder.append(nxt)
+                    stack.append(iter(order[offsets[nxt] : offsets[nxt + 1]]))
+                    break
+            else:
+                stack.pop()
+
+        edges: Dict[str, List[Tuple[Any, int]]] = {}
+        for i in preorder:
+            for cond, dst in self.transitions(order, offsets, i):
+                edges.setdefault(str(node_id[i]), []).append(
+                    (cond.to_json(), node_id[dst])
+                )
+        return {
+            "num_node": len(preorder),
+            "start_node": 0,
+            "accept_states": sorted(node_id[i] for i in preorder if self.accept[i]),
+            "edges": edges,
+            "fa_id": [
+                None if self.fa_id[i] == self.NO_FA_ID else self.fa_id[i]
+                for i in preorder
+            ],
+        }
+
+    @classmethod
+    def from_json(cls, obj: Dict[str, Any]) -> Self:
+        result = cls.empty(obj["num_node"], obj["start_node"])
+        for i, fa_id in enumerate(obj["fa_id"]):
+            if fa_id is not None:
+                result.fa_id[i] = fa_id
+        for i in obj["accept_states"]:
+            result.accept[i] = True
+        for src, successors in obj["edges"].items():
+            for cond, dst in successors:
+                if not cond:
+                    result.add_edge(int(src), cls.EPSILON, cls.EPSILON, dst)
+                for start, stop in cond:
+                    if start < stop:
+                        result.add_edge(int(src), start, stop, dst)
+        return result
@@ -0,0 +1,74 @@
+from collections import OrderedDict
+import hashlib
+import os
+from typing import Any, Dict, Optional
+
+from io_utils.json_cache import JsonCache
+from .array_automata import ArrayAutomata
+from .finite_automata import FiniteAutomata, NFANodeRegexOperation
+
+
+class MinDfaCache:
+    """
+    Minimized DFAs of regexes, keyed by regex source.
+
+    DFAs are stored in their `to_json` form, at most `max_entries` of them, least
+    recently used first out. If `directory` is given, entries are also kept there
+    in a `JsonCache` of at most `max_bytes`, which other processes can share.
+    Every `get` builds a new `FiniteAutomata`, and every `get_array` a new
+    `ArrayAutomata`, so callers may modify it.
+    """
+
+    # bump whenever the DFA built for the same regex changes
+    FORMAT_VERSION = 3
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        directory: Optional[str | os.PathLike] = None,
+        max_bytes: int = 16 << 20,
+    ):
+        self.max_entries = max_entries
+        self.entries: OrderedDict[str, Dict[str, Any]] = OrderedDict()
+        self.disk = None if directory is None else JsonCache(directory, max_bytes)
+
+    @classmethod
+    def key(cls, regex: str) -> str:
+        return hashlib.sha256(
+            (
+                "%d\n%d\n%s"
+                % (cls.FORMAT_VERSION, NFANodeRegexOperation.MAX_CHAR, regex)
+            ).encode()
+        ).hexdigest()
+
+    def get(self, regex: str) -> FiniteAutomata:
+        return FiniteAutomata.from_json(self.__get_json(regex))
+
+    def get_array(self, regex: str) -> ArrayAutomata:
+        return ArrayAutomata.from_json(self.__get_json(regex))
+
+    @staticmethod
+    def build(regex: str) -> Dict[str, Any]:
+        nfa = ArrayAutomata.from_fa(FiniteAutomata.from_string(regex))
+        return nfa.minimize().to_json()
+
+    def __get_json(self, regex: str) -> Dict[str, Any]:
+        obj = self.entries.get(regex)
+        if obj is not None:
+            self.entries.move_to_end(regex)
+            return obj
+        if self.disk is None:
+            obj = self.build(regex)
+        else:
+            key = self.key(regex)
+            obj = self.disk.get(key)
+            if obj is None:
+                obj = self.build(regex)
+                self.disk.put(key, obj)
+        self.entries[regex] = obj
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        return obj
+
+    def clear(self):
+        self.entries.clear()
@@ -21,27 +21,10 @@ from .finite_automata_node import (
 )
 from collections import deque
 from io_utils.to_json import ToJson
+from io_utils.from_json import FromJson
 
 
-class FANodeClosure:
-    # a simple helper class that implements __hash__ so that
-    # if the closure has been visited or not could be easily tracked
-    def __init__(self, s: Set[FiniteAutomataNode] = set()) -> None:
-        self.closure: Set[FiniteAutomataNode] = s
-        id_set = [node.fa_id for node in self.closure if node.fa_id is not None]
-        self.fa_id: Optional[int] = min(id_set) if id_set else None
-
-    def __hash__(self) -> int:
-        # could also use bitmasks, but too expensive?
-        return hash(tuple(sorted((node for node in self.closure), key=id)))
-
-    def __eq__(self, other: Self) -> bool:
-        return (
-            self.closure == other.closure
-        )  # that's the same set of nodes, simply compare the set equivalence
-
-
-class FiniteAutomata(ToJson):
+class FiniteAutomata(ToJson, FromJson):
     def __init__(
         self,
         start_node: FiniteAutomataNode,
@@ -105,81 +88,105 @@ class FiniteAutomata(ToJson):
         return result_ranges
 
     def determinize(self) -> Self:
-        def epsilon_closure(n: Iterable[FiniteAutomataNode]) -> FANodeClosure:
-            # the ϵ closure for a set of nodes
-            visited: Set[FiniteAutomataNode] = set()
-            que: Deque[FiniteAutomataNode] = deque(n)
-            while que:
-                cur = que.popleft()
-                if cur in visited:
-                    continue
-                visited.add(cur)
-                for cond, nxt in cur.successors:
-                    if nxt not in visited and not cond.ranges:
-                        que.append(nxt)
-            return FANodeClosure(visited)
-
-        start_closure = epsilon_closure([self.start_node])
-        que: Deque[FANodeClosure] = deque([start_closure])
-        visited: Set[FANodeClosure] = set()
-
-        closure_to_node: Dict[FANodeClosure, FiniteAutomataNode] = {
-            start_closure: FiniteAutomataNode(fa_id=start_closure.fa_id)
-        }
-
-        # now we have to consider how to merge accept actions
-        def contains_accept_state(fa_closure: FANodeClosure) -> bool:
-            return any(node in self.accept_states for node in fa_closure.closure)
-
-        accept_states = set()
-        if contains_accept_state(start_closure):
-            accept_states.add(start_closure)
-
-        while que:
-            cur = que.popleft()
-            if cur in visited:
-                continue
-            visited.add(cur)
-
-            # use scan line algo to generate the correct range to the set of reachable nodes mapping
-            # please take a look at test_finite_automata.py:test_determinize_split_by_0 for more information
-            all_ranges: List[Tuple[range, FiniteAutomataNode]] = [
-                (r, nxt_node)
-                for cur_node in cur.closure
-                for t, nxt_node in cur_node.successors
-                for r in t.ranges
+        """
+        Subset construction. NFA nodes are numbered, so that sets of them are
+        int bitsets, and the ϵ closure of every node is computed once up front.
+        The transitions of a DFA state are found with a sweep over the sorted
+        range bounds of its NFA nodes, and DFA states are interned by their
+        closure bitset.
+        """
+        nodes: List[FiniteAutomataNode] = [self.start_node]
+        node_id: Dict[FiniteAutomataNode, int] = {self.start_node: 0}
+        for cur in nodes:  # grows while iterating, i.e. a bfs
+            for _, nxt in cur.successors:
+                if nxt not in node_id:
+                    node_id[nxt] = len(nodes)
+                    nodes.append(nxt)
+
+        closures: List[int] = [0] * len(nodes)
+        for i in range(len(nodes) - 1, -1, -1):
+            # a finished closure already holds everything reachable from it
+            closure = 1 << i
+            stack = [nodes[i]]
+            while stack:
+                for cond, nxt in stack.pop().successors:
+                    j = node_id[nxt]
+                    if cond.ranges or closure >> j & 1:
+                        continue
+                    if closures[j]:
+                        closure |= closures[j]
+                    else:
+                        closure |= 1 << j
+                        stack.append(nxt)
+            closures[i] = closure
+
+        # (start, stop, ϵ closure of the target) of every non-ϵ edge of a node
+        edges: List[List[Tuple[int, int, int]]] = [
+            [
+                (r.start, r.stop, closures[node_id[nxt]])
+                for cond, nxt in node.successors
+                for r in cond.ranges
+                if r
             ]
-            all_ranges.sort(key=lambda k: (k[0].start, k[0].stop))
-            range_to_nodes: Dict[range, List[FiniteAutomataNode]] = {}
-            splits = sorted(
-                set(map(lambda k: k[0].start, all_ranges))
-                | set(map(lambda k: k[0].stop, all_ranges))
-            )
-            for r, n in all_ranges:
-                for sub_r in self.split_by(r, splits):
-                    range_to_nodes.setdefault(sub_r, list()).append(n)
-
-            # aggregate transitions that points to the same finite automata node sets
-            nodes_to_ranges: Dict[Tuple[FiniteAutomataNode, ...], List[range]] = {}
-            for range_, nxts in range_to_nodes.items():
-                nodes_to_ranges.setdefault(tuple(sorted(nxts, key=id)), list()).append(
-                    range_
-                )
-
-            for nxts, ranges in nodes_to_ranges.items():
-                cond = Transition(*ranges)
-                nxt_closure = epsilon_closure(nxts)
-                if nxt_closure not in closure_to_node:
-                    closure_to_node[nxt_closure] = FiniteAutomataNode(
-                        fa_id=nxt_closure.fa_id
+            for node in nodes
+        ]
+        accept_bits = 0
+        for node in self.accept_states:
+            if node in node_id:
+                accept_bits |= 1 << node_id[node]
+
+        def members(bits: int) -> Iterable[int]:
+            while bits:
+                low = bits & -bits
+                yield low.bit_length() - 1
+                bits ^= low
+
+        state_of: Dict[int, FiniteAutomataNode] = {}
+        accept_states: Set[FiniteAutomataNode] = set()
+        que: Deque[int] = deque()
+
+        def intern(bits: int) -> FiniteAutomataNode:
+            state = state_of.get(bits)
+            if state is None:
+                fa_ids = [
+                    nodes[i].fa_id for i in members(bits) if nodes[i].fa_id is not None
+                ]
+                state = FiniteAutomataNode(fa_id=min(fa_ids) if fa_ids else None)
+                state_of[bits] = state
+                if bits & accept_bits:
+                    accept_states.add(state)
+                que.append(bits)
+            return state
+
+        start_state = intern(closures[0])
+        while que:
+            bits = que.popleft()
+            events: List[Tuple[int, int, int]] = []
+            for i in members(bits):
+                for k, (start, stop, _) in enumerate(edges[i]):
+                    events.append((start, i, k))
+                    events.append((stop, i, ~k))
+            events.sort()
+            # sweep over the range bounds, the targets of all ranges that are open
+            # between two consecutive bounds make up the next state
+            active: Dict[Tuple[int, int], int] = {}
+            ranges_by_target: Dict[int, List[range]] = {}
+            for e, (pos, i, k) in enumerate(events):
+                if k >= 0:
+                    active[i, k] = edges[i][k][2]
+                else:
+                    del active[i, ~k]
+                if e + 1 < len(events) and events[e + 1][0] != pos and active:
+                    target = 0
+                    for closure in active.values():
+                        target |= closure
+                    ranges_by_target.setdefault(target, []).append(
+                        range(pos, events[e + 1][0])
                     )
-                    que.append(nxt_closure)
-                    if contains_accept_state(nxt_closure):
-                        accept_states.add(nxt_closure)
-                closure_to_node[cur].add_edge(cond, closure_to_node[nxt_closure])
-        return type(self)(
-            closure_to_node[start_closure], {closure_to_node[c] for c in accept_states}
-        )
+            state = state_of[bits]
+            for target, ranges in ranges_by_target.items():
+                state.add_edge(Transition(*ranges), intern(target))
+        return type(self)(start_state, accept_states)
 
     def reverse_edge(self) -> Self:
         # create a new FiniteAutomata with all edges reversed.
@@ -222,8 +229,120 @@ class FiniteAutomata(ToJson):
 
         return type(self)(rev_start_node, {node_map[self.start_node]})
 
-    def minimize(self) -> Self:
-        return self.reverse_edge().determinize().reverse_edge().determinize()
+    def minimize(self, method: str = "brzozowski") -> Self:
+        """
+        method:
+            "brzozowski": determinize the reversed automaton twice.
+            "hopcroft": partition refinement on `determinize()`, see
+                `hopcroft_minimize`. Keeps states with different `fa_id` apart.
+        """
+        if method == "brzozowski":
+            return self.reverse_edge().determinize().reverse_edge().determinize()
+        if method == "hopcroft":
+            return self.determinize().hopcroft_minimize()
+        raise ValueError("unknown method %r" % method)
+
+    def hopcroft_minimize(self) -> Self:
+        """
+        Minimize this DFA with Hopcroft's partition refinement, in
+        O(n * k * log n) for n states and k elementary ranges, i.e. the ranges
+        between consecutive range bounds of all transitions.
+
+        States start out partitioned by (accepting, fa_id), so equivalent accept
+        states of different automata in a `FiniteAutomataSet` stay apart.
+        """
+        nodes: List[FiniteAutomataNode] = []
+        node_id: Dict[FiniteAutomataNode, int] = {}
+        que: Deque[FiniteAutomataNode] = deque([self.start_node])
+        node_id[self.start_node] = 0
+        while que:
+            cur = que.popleft()
+            nodes.append(cur)
+            for cond, nxt in cur.successors:
+                assert cond.ranges, "hopcroft_minimize needs a DFA"
+                if nxt not in node_id:
+                    node_id[nxt] = len(node_id)
+                    que.append(nxt)
+
+        bounds = sorted(
+            {
+                bound
+                for node in nodes
+                for cond, _ in node.successors
+                for r in cond.ranges
+                for bound in (r.start, r.stop)
+            }
+        )
+        dead = len(nodes)
+        # delta[state][column], column c is range(bounds[c], bounds[c + 1])
+        delta = [[dead] * (len(bounds) - 1) for _ in range(dead + 1)]
+        for i, node in enumerate(nodes):
+            for cond, nxt in node.successors:
+                for r in cond.ranges:
+                    start = bisect_right(bounds, r.start) - 1
+                    stop = bisect_right(bounds, r.stop) - 1
+                    for c in range(start, stop):
+                        delta[i][c] = node_id[nxt]
+
+        inverse: List[Dict[int, List[int]]] = [{} for _ in range(len(bounds) - 1)]
+        for i, row in enumerate(delta):
+            for c, j in enumerate(row):
+                inverse[c].setdefault(j, []).append(i)
+
+        groups: Dict[Tuple[bool, Optional[int]], List[int]] = {}
+        for i, node in enumerate(nodes):
+            groups.setdefault((node in self.accept_states, node.fa_id), []).append(i)
+        groups.setdefault((False, None), []).append(dead)
+        blocks: List[Set[int]] = [set(group) for group in groups.values()]
+        block_of = [0] * (dead + 1)
+        for b, block in enumerate(blocks):
+            for i in block:
+                block_of[i] = b
+
+        largest = max(range(len(blocks)), key=lambda b: len(blocks[b]))
+        waiting = set(range(len(blocks))) - {largest}
+        while waiting:
+            splitter = list(blocks[waiting.pop()])
+            for column in inverse:
+                touched: Dict[int, Set[int]] = {}
+                for j in splitter:
+                    for i in column.get(j, ()):
+                        touched.setdefault(block_of[i], set()).add(i)
+                for b, part in touched.items():
+                    if len(part) == len(blocks[b]):
+                        continue
+                    blocks[b] -= part
+                    blocks.append(part)
+                    new_b = len(blocks) - 1
+                    for i in part:
+                        block_of[i] = new_b
+                    if b in waiting or len(part) <= len(blocks[b]):
+                        waiting.add(new_b)
+                    else:
+                        waiting.add(b)
+
+        # the block of the dead state only survives if it holds the start state
+        dead_block = block_of[dead]
+        representatives: Dict[int, int] = {}
+        new_nodes: Dict[int, FiniteAutomataNode] = {}
+        accept_states = set()
+        for b, block in enumerate(blocks):
+            if b == dead_block and b != block_of[0]:
+                continue
+            representatives[b] = next(i for i in block if i != dead)
+            new_nodes[b] = FiniteAutomataNode(fa_id=nodes[representatives[b]].fa_id)
+            if nodes[representatives[b]] in self.accept_states:
+                accept_states.add(new_nodes[b])
+        for b, node in new_nodes.items():
+            ranges_by_target: Dict[int, List[range]] = {}
+            for c, j in enumerate(delta[representatives[b]]):
+                if block_of[j] != dead_block:
+                    ranges_by_target.setdefault(block_of[j], []).append(
+                        range(bounds[c], bounds[c + 1])
+                    )
+            for target, ranges in ranges_by_target.items():
+                node.add_edge(Transition(*ranges), new_nodes[target])
+        return type(self)(new_nodes[block_of[0]], accept_states)
 
     def __deepcopy__(self, memo=None) -> Self:
         def dfs(
@@ -415,9 +534,20 @@ class FiniteAutomata(ToJson):
             "fa_id": list_fa_id,
         }
 
+    @classmethod
+    def from_json(cls, obj: Dict[str, Any]) -> Self:
+        nodes = [FiniteAutomataNode(fa_id=fa_id) for fa_id in obj["fa_id"]]
+        for src, successors in obj["edges"].items():
+            for cond, dst in successors:
+                nodes[int(src)].add_edge(Transition.from_json(cond), nodes[dst])
+        return cls(nodes[obj["start_node"]], {nodes[i] for i in obj["accept_states"]})
+
 
 class NFANodeRegexOperation(RegexOperation):
-    MAX_CHAR = 0x7F
+    # exclusive upper bound of code points, so that `.` and `[^...]` cover all of
+    # Unicode. Ranges are kept as ranges all the way down, and the scanner merges
+    # code points that behave alike into one class, see `LangDef._compile_scanner`
+    MAX_CHAR = 0x110000
 
     # impl RegexOperation<NFA>
     @staticmethod
@@ -433,9 +563,10 @@ class NFANodeRegexOperation(RegexOperation):
         if complementary:
             compl_ranges: List[range] = []
             start = cls.START
-            for r in ranges:
-                compl_ranges.append(range(start, r.start))
-                start = r.stop
+            for r in sorted(ranges, key=lambda r: r.start):
+                if start < r.start:
+                    compl_ranges.append(range(start, r.start))
+                start = max(start, r.stop)
             compl_ranges.append(range(start, cls.MAX_CHAR))
             ranges = tuple(compl_ranges)
         s = FiniteAutomataNode()
@@ -445,10 +576,8 @@ class NFANodeRegexOperation(RegexOperation):
 
     @classmethod
     def make_dot_nfa(cls) -> FiniteAutomata:
-        # only match printable ascii characters, i.e. no unicode support
-        return cls.make_inverse_nfa(
-            "\n"
-        )  # 0x7f is not printable thus doesn't include it
+        # any char but newline
+        return cls.make_inverse_nfa("\n")
 
     @classmethod
     def make_inverse_nfa(cls, s: str) -> FiniteAutomata:
@@ -507,6 +636,11 @@ class NFANodeRegexOperation(RegexOperation):
         return FiniteAutomata(s, {e})
 
 
+# escapes for chars that a grammar line can't hold, as it's split on spaces. Any
+# other escaped char stands for itself
+ESCAPES = {"n": "\n", "r": "\r", "t": "\t", "s": " \t\n\r"}
+
+
 def parse(r: Deque[str], regex_operation: RegexOperation):
     # op priority: {*, +} > concat > or
     ops = deque()  # operands, but doesn't consider "|" operators. We must first concatenate everything before "|" them
@@ -545,9 +679,11 @@ def parse(r: Deque[str], regex_operation: RegexOperation):
                     _ = r.popleft()
                     e = r.popleft()
                     ranges.append(range(ord(s), ord(e) + 1))
+                elif r[0] == "\\":
+                    r.popleft()
+                    s = r.popleft()
+                    ranges.extend(range(ord(c), ord(c) + 1) for c in ESCAPES.get(s, s))
                 else:
-                    if r[0] == "\\":
-                        r.popleft()
                     s = r.popleft()
                     ranges.append(range(ord(s), ord(s) + 1))
                 if r[0] == "]":
@@ -558,9 +694,18 @@ def parse(r: Deque[str], regex_operation: RegexOperation):
             )
         elif s == ".":
             ops.append(regex_operation.make_dot_nfa())
+        elif s == "\\":
+            s = r.popleft()
+            s = ESCAPES.get(s, s)
+            if len(s) == 1:
+                ops.append(regex_operation.make_nfa(s))
+            else:
+                ops.append(
+                    regex_operation.make_range_nfa(
+                        *(range(ord(c), ord(c) + 1) for c in s)
+                    )
+                )
         elif len(s) == 1:
-            if s == "\\":
-                s = r.popleft()
             ops.append(regex_operation.make_nfa(s))
     if ops:
         or_ops.append(reduce_concat())
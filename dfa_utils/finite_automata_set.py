@@ -1,23 +1,42 @@
 from typing import Iterable
+from dfa_utils.array_automata import ArrayAutomata
 from dfa_utils.finite_automata import FiniteAutomata
-from dfa_utils.finite_automata_node import EpsilonTransition, FiniteAutomataNode
 from io_utils.to_json import ToJson
 
 
 class FiniteAutomataSet(ToJson):
-    def __init__(self, fa_set: Iterable[FiniteAutomata]):
-        # merge into one mega dfa
-        start = FiniteAutomataNode()
-        accept_states = set()
+    def __init__(
+        self,
+        fa_set: Iterable[FiniteAutomata | ArrayAutomata],
+        minimize: bool = True,
+        utf8: bool = False,
+    ):
+        """
+        If `utf8` is True, the DFA runs on the bytes of UTF-8 encoded input
+        rather than on code points, see `ArrayAutomata.to_utf8`.
+        """
+        # merge into one mega dfa, built on arrays rather than node objects
+        automata = []
         for i, fa in enumerate(fa_set):
-            start.add_edge(EpsilonTransition(), fa.start_node)
-            for accept_state in fa.accept_states:
-                accept_state.fa_id = i
-                accept_states.add(accept_state)
-        self.fa = FiniteAutomata(start, accept_states).determinize()
+            if isinstance(fa, FiniteAutomata):
+                fa = ArrayAutomata.from_fa(fa)
+            fa.set_accept_fa_id(i)
+            automata.append(fa)
+        self.automata = ArrayAutomata.union(automata).determinize()
+        if minimize:
+            # accept states of different automata are kept apart by their fa_id
+            self.automata = self.automata.hopcroft_minimize()
+        if utf8:
+            self.automata = self.automata.to_utf8().determinize()
+            if minimize:
+                self.automata = self.automata.hopcroft_minimize()
+
+    @property
+    def fa(self) -> FiniteAutomata:
+        return self.automata.to_fa()
 
     def match_one(self, s: Iterable[str]) -> str:
-        return self.fa.match_first(s)
+        return self.automata.match_first(s)
 
     def to_json(self):
-        return self.fa.to_json()
+        return self.automata.to_json()
@@ -0,0 +1,53 @@
+from typing import Iterator, List, Tuple
+
+SURROGATES = (0xD800, 0xDFFF)  # code points that have no UTF-8 encoding
+MAX_CODE_POINT = {1: 0x7F, 2: 0x7FF, 3: 0xFFFF}  # by encoded length
+
+
+def encode(cp: int) -> bytes:
+    return chr(cp).encode("utf-8")
+
+
+def utf8_sequences(lo: int, hi: int) -> Iterator[List[Tuple[int, int]]]:
+    """
+    Split the code points `lo` to `hi` (both inclusive) into sequences of
+    inclusive byte ranges, such that the UTF-8 encodings of the code points are
+    exactly the byte strings matched by one of the sequences. Sequences are
+    yielded in code point order, and surrogates are left out.
+
+    e.g. "a" to "α" (0x61 to 0x3B1) gives [(0x61, 0x7F)],
+    [(0xC2, 0xCD), (0x80, 0xBF)] and [(0xCE, 0xCE), (0x80, 0xB1)].
+    """
+    stack = [(lo, hi)]
+    while stack:
+        lo, hi = stack.pop()
+        if lo > hi:
+            continue
+        if lo <= SURROGATES[1] and SURROGATES[0] <= hi:
+            stack.append((SURROGATES[1] + 1, hi))
+            stack.append((lo, SURROGATES[0] - 1))
+            continue
+        # both ends must have the same encoded length
+        split = next((m for m in MAX_CODE_POINT.values() if lo <= m < hi), None)
+        if split is not None:
+            stack.append((split + 1, hi))
+            stack.append((lo, split))
+            continue
+        if hi <= 0x7F:
+            yield [(lo, hi)]
+            continue
+        # and every continuation byte but the last must either be fixed, or
+        # cover its full range 0x80 to 0xBF
+        for i in range(1, 4):
+            m = (1 << (6 * i)) - 1
+            if lo & ~m != hi & ~m:
+                if lo & m:
+                    stack.append(((lo | m) + 1, hi))
+                    stack.append((lo, lo | m))
+                    break
+                if hi & m != m:
+                    stack.append((hi & ~m, hi))
+                    stack.append((lo, (hi & ~m) - 1))
+                    break
+        else:
+            yield list(zip(encode(lo), encode(hi)))
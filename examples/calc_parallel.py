@@ -0,0 +1,59 @@
+import sys
+import os
+
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+
+from lang_def import LangDef  # noqa: E402
+from lang_def_builder import LangDefBuilder  # noqa: E402
+
+
+GRAMMAR = """
+    START -> E
+    E -> E "+" T | E "-" T | T
+    T -> T "*" F | F
+    F -> "(" E ")" | int_const
+    int_const -> r"0|(-?)[1-9][0-9]*"
+    """
+
+
+def register(ld: LangDef):
+    """
+    Productions of `GRAMMAR`, loaded with `ld.load_productions(
+    "examples.calc_parallel:register")` so that worker processes can load them too.
+    """
+
+    @ld.production("E -> T", "T -> F", "F -> int_const")
+    def __identity(_, e: int) -> int:
+        return e
+
+    @ld.production('E -> E "+" T')
+    def __add(_, e: int, _p: str, t: int) -> int:
+        return e + t
+
+    @ld.production('E -> E "-" T')
+    def __sub(_, e: int, _m: str, t: int) -> int:
+        return e - t
+
+    @ld.production('T -> T "*" F')
+    def __mul(_, t: int, _m: str, f: int) -> int:
+        return t * f
+
+    @ld.production('F -> "(" E ")"')
+    def __par(_, _l, e: int, _r) -> int:
+        return e
+
+    @ld.production('int_const -> r"0|(-?)[1-9][0-9]*"')
+    def __int(_, int_const: str) -> int:
+        return int(int_const)
+
+
+if __name__ == "__main__":
+    # evaluate every line of the given file with all cores
+    ld = LangDefBuilder.new(GRAMMAR)
+    ld.load_productions("examples.calc_parallel:register")
+    with open(sys.argv[1], "r", encoding="utf-8") as f:
+        lines = f.read().splitlines()
+    for line, result in zip(lines, ld.eval_parallel(lines)):
+        print(line, "=", result)
@@ -0,0 +1,68 @@
+import json
+import os
+import tempfile
+from typing import Any, Optional
+
+
+class JsonCache:
+    """
+    A directory of json files addressed by key, bounded to `max_bytes` in total.
+
+    Writes go to a temporary file which is then renamed over the entry, so readers
+    (including other processes) never see a partial entry. Every hit refreshes the
+    mtime of the entry, and the least recently used entries are evicted first.
+    """
+
+    SUFFIX = ".json"
+
+    def __init__(self, directory: str | os.PathLike, max_bytes: int = 64 << 20):
+        self.directory = os.fspath(directory)
+        self.max_bytes = max_bytes
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key + self.SUFFIX)
+
+    def get(self, key: str) -> Optional[Any]:
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                obj = json.load(f)
+            os.utime(path)
+        except (OSError, ValueError):  # missing, concurrently evicted or corrupted
+            return None
+        return obj
+
+    def put(self, key: str, obj: Any):
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(obj, f, separators=(",", ":"))
+            os.replace(tmp_path, self._path(key))
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        self.evict()
+
+    def evict(self):
+        """
+        Remove least recently used entries until the cache fits in `max_bytes`.
+        """
+        entries = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.name.endswith(self.SUFFIX):
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+            total -= size
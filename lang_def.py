@@ -1,5 +1,29 @@
-from typing import Any, Deque, List, Dict, Optional, Set, Tuple, Callable, Iterable
+from typing import (
+    IO,
+    Any,
+    Deque,
+    List,
+    Dict,
+    Optional,
+    Set,
+    Tuple,
+    Callable,
+    Iterable,
+)
 from collections import deque
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from functools import partial
+from itertools import islice
+import importlib
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+
+BytesLike = bytes | bytearray | memoryview | mmap.mmap
 
 
 class LangDef:
@@ -16,6 +40,30 @@ class LangDef:
     When build from scratch, put typedef.to_json(), action.to_json(), and goto.to_json() here.
     """
 
+    CHAR_LIMIT = 0x110000  # exclusive upper bound of code points
+    SCAN_WINDOW = 1 << 14  # chars scanned per batch of spans
+    # remember (state, position) pairs that can't reach an accept, see `_scan_buffer`
+    SCAN_MEMOIZE = False
+
+    # binary format, see `to_bytes`
+    BINARY_MAGIC = b"LDEF"
+    BINARY_VERSION = 1
+    _BINARY_HEADER = struct.Struct("<4sII")  # magic, version, number of sections
+    _BINARY_SECTION = struct.Struct("<15scQQ")  # name, typecode, offset, size
+    _BINARY_TABLES = (
+        "_class_starts",
+        "_class_ids",
+        "_ascii_class",
+        "_delta",
+        "_accept",
+        "_action",
+        "_goto",
+        "_prod_nargs",
+        "_prod_lhs",
+    )
+    # only there if the LangDef has a UTF-8 byte scanner
+    _BINARY_UTF8_TABLES = ("_utf8_delta", "_utf8_accept")
+
     def __init__(
         self,
         dfa_set_json: Dict[str, Any],
@@ -23,15 +71,343 @@ class LangDef:
         prod_id_to_narg_and_non_terminal: Dict[str, Tuple[int, str]],
         action_json: Dict,
         goto_json: Dict,
+        utf8_dfa_set_json: Optional[Dict[str, Any]] = None,
+        skip_ids: Optional[Iterable[int]] = None,
     ):
-        self.dfa_set_json = dfa_set_json
+        """
+        `utf8_dfa_set_json` is the same scanner DFA over the bytes of UTF-8 encoded
+        input, see `TypeDefinition.get_dfa_set`. With it, `scan_bytes_spans` and
+        `scan_file` run on a 256-entry table per state and never decode.
+
+        `skip_ids` are the patterns whose tokens the scanner drops, see
+        `TypeDefinition.skip_ids`. If it's None, spaces, tabs and newlines between
+        tokens are skipped instead.
+        """
+        self._dfa_set_json: Optional[Dict[str, Any]] = dfa_set_json
+        self._utf8_dfa_set_json = utf8_dfa_set_json
+        self.skip_ids = None if skip_ids is None else sorted(skip_ids)
         self.raw_grammar_to_id = raw_grammar_to_id
         self.prod_id_to_narg_and_non_terminal = prod_id_to_narg_and_non_terminal
-        self.action_json = action_json
-        self.goto_json = goto_json
+        self._action_json: Optional[Dict] = action_json
+        self._goto_json: Optional[Dict] = goto_json
 
         self.prod_id_to_fn: Dict[str, Callable] = {}  # this member won't be exported
         # but still, use same convention that key is str
+        self._production_refs: List[str] = []  # see `load_productions`
+        self._mapping: Optional[mmap.mmap] = None  # see `from_file`
+        # prod id -> function, for those registered by `load_productions`
+        self._ref_prod_fns: Dict[str, Callable] = {}
+
+        self._compile_scanner()
+        self._compile_utf8_scanner()
+        self._compile_parser()
+
+    def _compile_scanner(self):
+        """
+        Compile `dfa_set_json` into a dense transition table, so that `scan` never
+        touches the json structure.
+
+        Every range boundary on every edge splits the code points into segments.
+        Segments that lead to the same destination from every state are merged into
+        one equivalence class. A char is mapped to its class through `_ascii_class`
+        for ASCII, or by bisecting `_class_starts` otherwise. The DFA itself becomes a
+        flat `array("i")` of `num_node * num_class`. States are addressed by their row
+        offset `state * num_class`, so each step is `delta[row + class]`, which gives
+        the row of the next state, or -1 if there's no transition. `accept` is indexed
+        by row offset as well, and holds the pattern id, `-2 - id` for the patterns in
+        `skip_ids`, or -1. Class 0 is always the dead class.
+        """
+        dfa = self._dfa_set_json
+        assert dfa is not None
+        num_node: int = max(dfa.get("num_node", 0), 1)  # at least one dead state
+        edges: Dict[str, List[Tuple[List[Tuple[int, int]], int]]] = dfa.get("edges", {})
+        any_char = ((0, self.CHAR_LIMIT),)  # an empty condition matches anything
+
+        bounds = {0, self.CHAR_LIMIT}
+        for conds in edges.values():
+            for cond, _ in conds:
+                for l, r in cond or any_char:
+                    bounds.add(l)
+                    bounds.add(r)
+        seg_starts = sorted(bounds)[:-1]
+
+        columns = [[-1] * num_node for _ in seg_starts]
+        for src, conds in edges.items():
+            src_node = int(src)
+            for cond, nxt_node in conds:
+                for l, r in cond or any_char:
+                    for seg in range(
+                        bisect_left(seg_starts, l), bisect_left(seg_starts, r)
+                    ):
+                        if columns[seg][src_node] == -1:  # first edge wins
+                            columns[seg][src_node] = nxt_node
+
+        column_to_class: Dict[Tuple[int, ...], int] = {tuple([-1] * num_node): 0}
+        class_starts: List[int] = []
+        class_ids: List[int] = []
+        for start, column in zip(seg_starts, columns):
+            cls = column_to_class.setdefault(tuple(column), len(column_to_class))
+            if not class_ids or class_ids[-1] != cls:  # merge adjacent segments
+                class_starts.append(start)
+                class_ids.append(cls)
+
+        num_class = len(column_to_class)
+        delta = array("i", [-1]) * (num_node * num_class)
+        for column, cls in column_to_class.items():
+            for state, nxt_node in enumerate(column):
+                if nxt_node != -1:
+                    delta[state * num_class + cls] = nxt_node * num_class
+
+        accept = array("i", [-1]) * (num_node * num_class)
+        fa_id: List[Optional[int]] = dfa.get("fa_id", [])
+        skip_ids = set(self.skip_ids or ())
+        for state in dfa.get("accept_states", ()):
+            if fa_id[state] is not None:
+                pattern_id = fa_id[state]
+                accept[state * num_class] = (
+                    -2 - pattern_id if pattern_id in skip_ids else pattern_id
+                )
+
+        self._start: int = dfa.get("start_node", 0) * num_class
+        self._num_class = num_class
+        self._delta = delta
+        self._accept = accept
+        self._class_starts = class_starts
+        self._class_ids = class_ids
+        self._ascii_class = array(
+            "i", (class_ids[bisect_right(class_starts, c) - 1] for c in range(0x80))
+        )
+
+    def _compile_utf8_scanner(self):
+        """
+        Compile `utf8_dfa_set_json` into `_utf8_delta`, a flat `array("i")` with a
+        row of 256 entries per state, indexed by the next byte. Like `_delta`, states
+        are addressed by their row offset `state * 256`, and -1 means there's no
+        transition. `_utf8_accept` is indexed by row offset as well, and holds the
+        same values as `_accept`.
+        """
+        dfa = self._utf8_dfa_set_json
+        self._utf8_delta: Optional[Any] = None
+        self._utf8_accept: Optional[Any] = None
+        self._utf8_start = 0
+        if dfa is None:
+            return
+        num_node: int = max(dfa.get("num_node", 0), 1)
+        delta = array("i", [-1]) * (num_node << 8)
+        for src, conds in dfa.get("edges", {}).items():
+            row = int(src) << 8
+            for cond, nxt_node in conds:
+                for l, r in cond or ((0, 0x100),):
+                    for byte in range(l, min(r, 0x100)):
+                        if delta[row + byte] == -1:  # first edge wins
+                            delta[row + byte] = nxt_node << 8
+        accept = array("i", [-1]) * (num_node << 8)
+        fa_id: List[Optional[int]] = dfa.get("fa_id", [])
+        skip_ids = set(self.skip_ids or ())
+        for state in dfa.get("accept_states", ()):
+            if fa_id[state] is not None:
+                pattern_id = fa_id[state]
+                accept[state << 8] = (
+                    -2 - pattern_id if pattern_id in skip_ids else pattern_id
+                )
+        self._utf8_start = dfa.get("start_node", 0) << 8
+        self._utf8_delta = delta
+        self._utf8_accept = accept
+
+    def _compile_parser(self):
+        """
+        Compile `action_json`, `goto_json` and production metadata into flat integer
+        tables, so that `parse` does no string formatting or dict hashing.
+
+        Terminal columns are `token id + 1`, so that EOF (-1) is column 0.
+        Non-terminals are densely numbered in `_non_terminals`. An ACTION entry is
+        packed into one int: `state + 1` for shift, `-(production id + 1)` for
+        reduce, and 0 for error. Production 0 is never reduced, as reducing it means
+        accept, so -1 is accept.
+        """
+        assert self._action_json is not None and self._goto_json is not None
+        action_table: List[Dict[str, Any]] = self._action_json.get("table", [])
+        goto_table: List[Dict[str, int]] = self._goto_json.get("table", [])
+        num_state = max(len(action_table), len(goto_table), 1)
+
+        max_token_id = max(
+            [int(k) for row in action_table for k in row]
+            + [fa_id for fa_id in self._accept],
+            default=-1,
+        )
+        num_term = max_token_id + 2
+        action = array("i", [0]) * (num_state * num_term)
+        for state, row in enumerate(action_table):
+            for token_type, entry in row.items():
+                if entry is None:
+                    continue
+                action_type, val = entry
+                if action_type == 0:  # shift
+                    packed = val + 1
+                elif action_type == 1:  # reduce
+                    packed = -(val + 1)
+                else:  # accept
+                    packed = -1
+                action[state * num_term + int(token_type) + 1] = packed
+
+        non_terminals: List[str] = []
+        non_terminal_to_id: Dict[str, int] = {}
+        for _, non_terminal in self.prod_id_to_narg_and_non_terminal.values():
+            non_terminal_to_id.setdefault(non_terminal, len(non_terminal_to_id))
+        for row in goto_table:
+            for non_terminal in row:
+                non_terminal_to_id.setdefault(non_terminal, len(non_terminal_to_id))
+        non_terminals.extend(non_terminal_to_id)
+        num_nt = max(len(non_terminals), 1)
+        goto = array("i", [-1]) * (num_state * num_nt)
+        for state, row in enumerate(goto_table):
+            for non_terminal, nxt_state in row.items():
+                if nxt_state is not None:
+                    goto[state * num_nt + non_terminal_to_id[non_terminal]] = nxt_state
+
+        narg_and_lhs = self.prod_id_to_narg_and_non_terminal
+        num_prod = max(map(int, narg_and_lhs), default=-1) + 1
+        prod_nargs = array("i", [0]) * num_prod
+        prod_lhs = array("i", [0]) * num_prod
+        for prod_id, (nargs, non_terminal) in narg_and_lhs.items():
+            prod_nargs[int(prod_id)] = nargs
+            prod_lhs[int(prod_id)] = non_terminal_to_id[non_terminal]
+
+        self._num_term = num_term
+        self._action = action
+        self._non_terminals = non_terminals
+        self._num_nt = num_nt
+        self._goto = goto
+        self._prod_nargs = prod_nargs
+        self._prod_lhs = prod_lhs
+        self._init_prod_fn()
+
+    def _init_prod_fn(self):
+        self._prod_fn: List[Callable] = [
+            partial(self._missing_production, prod_id)
+            for prod_id in range(len(self._prod_nargs))
+        ]
+        for prod_id, fn in self.prod_id_to_fn.items():
+            self._prod_fn[int(prod_id)] = fn
+
+    @property
+    def dfa_set_json(self) -> Dict[str, Any]:
+        if self._dfa_set_json is None:  # loaded by `from_bytes`
+            self._dfa_set_json = self._decompile_scanner()
+        return self._dfa_set_json
+
+    @property
+    def utf8_dfa_set_json(self) -> Optional[Dict[str, Any]]:
+        if self._utf8_dfa_set_json is None and self._utf8_delta is not None:
+            self._utf8_dfa_set_json = self._decompile_utf8_scanner()
+        return self._utf8_dfa_set_json
+
+    @property
+    def action_json(self) -> Dict:
+        if self._action_json is None:
+            self._action_json = self._decompile_action()
+        return self._action_json
+
+    @property
+    def goto_json(self) -> Dict:
+        if self._goto_json is None:
+            self._goto_json = self._decompile_goto()
+        return self._goto_json
+
+    def _decompile_scanner(self) -> Dict[str, Any]:
+        # an equivalent DFA with one edge per (state, class), built from the tables
+        num_class, delta, accept = self._num_class, self._delta, self._accept
+        class_ranges: List[List[Tuple[int, int]]] = [[] for _ in range(num_class)]
+        ends = list(self._class_starts[1:]) + [self.CHAR_LIMIT]
+        for start, end, cls in zip(self._class_starts, ends, self._class_ids):
+            class_ranges[cls].append((start, end))
+        num_node = len(delta) // num_class
+        edges: Dict[str, List[Tuple[List[Tuple[int, int]], int]]] = {}
+        for state in range(num_node):
+            row = state * num_class
+            for cls in range(1, num_class):
+                if delta[row + cls] != -1:
+                    edges.setdefault(str(state), []).append(
+                        (class_ranges[cls], delta[row + cls] // num_class)
+                    )
+        fa_id = [
+            self._decode_accept(accept[state * num_class]) for state in range(num_node)
+        ]
+        return {
+            "num_node": num_node,
+            "start_node": self._start // num_class,
+            "accept_states": [
+                s for s, pattern_id in enumerate(fa_id) if pattern_id is not None
+            ],
+            "edges": edges,
+            "fa_id": fa_id,
+        }
+
+    @staticmethod
+    def _decode_accept(entry: int) -> Optional[int]:
+        # the pattern id of an `_accept` entry
+        return None if entry == -1 else -2 - entry if entry < -1 else entry
+
+    def _decompile_utf8_scanner(self) -> Dict[str, Any]:
+        delta, accept = self._utf8_delta, self._utf8_accept
+        assert delta is not None and accept is not None
+        edges: Dict[str, List[Tuple[List[Tuple[int, int]], int]]] = {}
+        num_node = len(accept) >> 8
+        for state in range(num_node):
+            row = state << 8
+            ranges_by_target: Dict[int, List[Tuple[int, int]]] = {}
+            for byte in range(0x100):
+                if delta[row + byte] == -1:
+                    continue
+                ranges = ranges_by_target.setdefault(delta[row + byte] >> 8, [])
+                if ranges and ranges[-1][1] == byte:
+                    ranges[-1] = (ranges[-1][0], byte + 1)
+                else:
+                    ranges.append((byte, byte + 1))
+            for target, ranges in ranges_by_target.items():
+                edges.setdefault(str(state), []).append((ranges, target))
+        fa_id = [self._decode_accept(entry) for entry in accept[::0x100]]
+        return {
+            "num_node": num_node,
+            "start_node": self._utf8_start >> 8,
+            "accept_states": [
+                s for s, pattern_id in enumerate(fa_id) if pattern_id is not None
+            ],
+            "edges": edges,
+            "fa_id": fa_id,
+        }
+
+    def _decompile_action(self) -> Dict:
+        num_term, action = self._num_term, self._action
+        table: List[Dict[str, Optional[Tuple[int, Optional[int]]]]] = []
+        for row in range(0, len(action), num_term):
+            entries: Dict[str, Optional[Tuple[int, Optional[int]]]] = {}
+            for column in range(num_term):
+                act = action[row + column]
+                if act > 0:
+                    entries[str(column - 1)] = (0, act - 1)
+                elif act < -1:
+                    entries[str(column - 1)] = (1, -act - 1)
+                elif act == -1:
+                    entries[str(column - 1)] = (2, None)
+            table.append(entries)
+        return {"state_count": len(table), "table": table}
+
+    def _decompile_goto(self) -> Dict:
+        num_nt, goto, non_terminals = self._num_nt, self._goto, self._non_terminals
+        table: List[Dict[str, int]] = [
+            {
+                non_terminal: goto[row + nt]
+                for nt, non_terminal in enumerate(non_terminals)
+                if goto[row + nt] != -1
+            }
+            for row in range(0, len(goto), num_nt)
+        ]
+        return {"state_count": len(table), "table": table}
+
+    @staticmethod
+    def _missing_production(prod_id: int, *_):
+        raise KeyError("no function registered for production %d" % prod_id)
 
     def production(self, *productions: str):
         """
@@ -44,59 +420,495 @@ class LangDef:
 
         def decorate(function: Callable):
             for prod in productions:
-                self.prod_id_to_fn[str(self.raw_grammar_to_id[prod])] = function
+                prod_id = self.raw_grammar_to_id[prod]
+                self.prod_id_to_fn[str(prod_id)] = function
+                self._prod_fn[prod_id] = function
             return function
 
         return decorate
 
     @staticmethod
     def match_one(dfa: Dict[str, Any], s: Deque[str]) -> Tuple[int, str]:
+        """
+        Pop the longest prefix of `s` that `dfa` accepts, returning `(id, word)`, or
+        `(-1, "")` if there's none. Chars read after the last accept are pushed back
+        onto `s`, so that the next call starts right after `word`.
+        """
         cur_node: int = dfa["start_node"]
         accept_states: Set[int] = set(dfa["accept_states"])
         fa_id: List[Optional[int]] = dfa["fa_id"]
-        buffer = []
-        accepted_buffer = []
+        buffer: List[str] = []
+        accepted = 0  # length of the accepted prefix of buffer
         last_accept_state_fa_id: Optional[int] = None
-        while s:
-            c = s.popleft()
-            any_hit = False
+        while True:
             if cur_node in accept_states:
                 if fa_id[cur_node] is not None:
                     last_accept_state_fa_id = fa_id[cur_node]
-                accepted_buffer.extend(buffer)
-                buffer.clear()
+                accepted = len(buffer)
+            if not s:
+                break
+            c = s[0]
             for cond, nxt_node in dfa["edges"].get(str(cur_node), ()):
                 # cond: List[Tuple[int, int]]
                 # nxt_node: int
                 if not cond or any(
                     l <= ord(c) < r for l, r in cond
                 ):  # TODO: use bisect_right - 1
-                    buffer.append(c)
-                    cur_node = nxt_node
-                    any_hit = True
                     break
-            if not any_hit:
-                s.appendleft(c)
+            else:
                 break
-        if cur_node in accept_states:
-            if fa_id[cur_node] is not None:
-                last_accept_state_fa_id = fa_id[cur_node]
-            accepted_buffer.extend(buffer)
-            buffer.clear()
-        if accepted_buffer and last_accept_state_fa_id is not None:
-            return (last_accept_state_fa_id, "".join(accepted_buffer))
+            buffer.append(s.popleft())
+            cur_node = nxt_node
+        s.extendleft(reversed(buffer[accepted:]))
+        if accepted and last_accept_state_fa_id is not None:
+            return (last_accept_state_fa_id, "".join(buffer[:accepted]))
         return (-1, "")
 
-    def scan(self, s: str) -> Iterable[Tuple[int, str]]:
-        deque_s = deque(s)
-        while deque_s:
-            (id, word) = self.match_one(self.dfa_set_json, deque_s)
-            if word:
-                yield id, word
+    def _scan_buffer(
+        self,
+        s: str,
+        i: int,
+        n: int,
+        final: bool,
+        skip: bool,
+        out: List[Tuple[int, int, int]],
+    ) -> Tuple[int, bool]:
+        """
+        Scan `s[i:n]`, appending `(id, start, end)` spans to `out`.
+
+        When `final` is False, `s[:n]` is only a prefix of the input. Scanning then
+        stops at the first token that reaches `n` while the DFA is still running, since
+        more input might extend it. Returns the position to resume from, and whether
+        whitespace was being skipped at that position. Whitespace is only skipped here
+        if `skip_ids` is None, otherwise tokens of the `skip_ids` patterns are matched
+        like any other and left out of `out`.
+
+        The next token starts right where the last one ended, so chars that were read
+        past the last accept are read again. With `SCAN_MEMOIZE`, every (state,
+        position) pair read past the last accept is remembered as failed, and a later
+        token stops as soon as it reaches one (Reps, "Maximal-munch" tokenization in
+        linear time, 1998). Each pair then fails at most once, which bounds the
+        rereading by the number of states times the input length.
+        """
+        start, delta, accept = self._start, self._delta, self._accept
+        ascii_class, class_starts, class_ids = (
+            self._ascii_class,
+            self._class_starts,
+            self._class_ids,
+        )
+        stride = len(delta)  # memo key of state `cur` at position `j`: j * stride + cur
+        skip_whitespace = self.skip_ids is None  # else the DFA drops what's skipped
+        memo: Optional[Set[int]] = set() if self.SCAN_MEMOIZE else None
+        trail: List[int] = []  # memo keys read by the current token
+        while True:
+            if skip:
+                while i < n and s[i] in " \t\n":
+                    i += 1
+            if i >= n:
+                return i, skip
+            # maximal munch from i, remembering the last accepting position
+            cur, j = start, i
+            last_fa_id, last_end = -1, i
+            while True:
+                if accept[cur] != -1:
+                    last_fa_id, last_end = accept[cur], j
+                if j == n:
+                    break
+                o = ord(s[j])
+                nxt = delta[
+                    cur
+                    + (
+                        ascii_class[o]
+                        if o < 0x80
+                        else class_ids[bisect_right(class_starts, o) - 1]
+                    )
+                ]
+                if nxt < 0:
+                    break
+                cur = nxt
+                j += 1
+                if memo is not None:
+                    if j * stride + cur in memo:
+                        break  # known not to reach an accept
+                    trail.append(j * stride + cur)
+            if j == n and not final:
+                return i, False  # the token might go on in the next buffer
+            if memo is not None:
+                # only what was read past the last accept failed
+                memo.update(key for key in trail if key >= (last_end + 1) * stride)
+                trail.clear()
+            if last_end > i:
+                if last_fa_id >= 0:  # not skipped
+                    out.append((last_fa_id, i, last_end))
+                i = last_end  # same as match_one, rescan what was read after it
+            else:
+                i += 1  # if no match, skip a char, and try again from the next one
+            skip = skip_whitespace
+
+    def scan_spans(self, s: str) -> Iterable[Tuple[int, int, int]]:
+        """
+        Scan `s` by integer positions, yielding `(id, start, end)` for each token,
+        so that `s[start:end]` is the matched word. No per-char objects are created,
+        and only a window of spans is kept at a time. Unlike `scan`, no EOF token is
+        yielded.
+        """
+        out: List[Tuple[int, int, int]] = []
+        i, n, skip = 0, len(s), False
+        window = self.SCAN_WINDOW
+        while i < n:
+            end = min(i + window, n)
+            nxt, skip = self._scan_buffer(s, i, end, end == n, skip, out)
+            yield from out
+            out.clear()
+            # a token longer than the window makes no progress, widen it
+            window = self.SCAN_WINDOW if nxt > i else window * 2
+            i = nxt
+
+    @staticmethod
+    def _decode_utf8(b: BytesLike, j: int, n: int) -> Tuple[int, int]:
+        """
+        Decode the non-ASCII char that starts at `b[j]`, returning `(code point,
+        width)`. The code point is -1 for ill-formed bytes (width 1), or when the
+        sequence is cut off by `n`.
+        """
+        o = b[j]
+        if 0xC0 <= o < 0xE0:
+            cp, width = o & 0x1F, 2
+        elif 0xE0 <= o < 0xF0:
+            cp, width = o & 0x0F, 3
+        elif 0xF0 <= o < 0xF8:
+            cp, width = o & 0x07, 4
+        else:
+            return -1, 1
+        if j + width > n:
+            return -1, width
+        for k in range(j + 1, j + width):
+            if b[k] & 0xC0 != 0x80:
+                return -1, 1
+            cp = cp << 6 | b[k] & 0x3F
+        return cp, width
+
+    def _scan_utf8_buffer(
+        self,
+        b: BytesLike,
+        i: int,
+        n: int,
+        final: bool,
+        skip: bool,
+        out: List[Tuple[int, int, int]],
+    ) -> Tuple[int, bool]:
+        """
+        Same as `_scan_buffer`, but over UTF-8 encoded bytes. Positions are byte
+        offsets, and a char is never split, so the spans always cut at char boundaries.
+        """
+        start, delta, accept = self._start, self._delta, self._accept
+        ascii_class, class_starts, class_ids = (
+            self._ascii_class,
+            self._class_starts,
+            self._class_ids,
+        )
+        decode = self._decode_utf8
+        stride = len(delta)
+        skip_whitespace = self.skip_ids is None
+        memo: Optional[Set[int]] = set() if self.SCAN_MEMOIZE else None
+        trail: List[int] = []
+        while True:
+            if skip:
+                while i < n and b[i] in b" \t\n":
+                    i += 1
+            if i >= n:
+                return i, skip
+            cur, j = start, i
+            last_fa_id, last_end = -1, i
+            while True:
+                if accept[cur] != -1:
+                    last_fa_id, last_end = accept[cur], j
+                if j == n:
+                    break
+                o = b[j]
+                if o < 0x80:
+                    cls, width = ascii_class[o], 1
+                else:
+                    o, width = decode(b, j, n)
+                    if o < 0 and j + width > n and not final:
+                        j = n  # the char is cut off by the end of the buffer
+                        break
+                    cls = class_ids[bisect_right(class_starts, o) - 1] if o >= 0 else 0
+                nxt = delta[cur + cls]
+                if nxt < 0:
+                    break
+                cur = nxt
+                j += width
+                if memo is not None:
+                    if j * stride + cur in memo:
+                        break
+                    trail.append(j * stride + cur)
+            if j == n and not final:
+                return i, False
+            if memo is not None:
+                # only what was read past the last accept failed
+                memo.update(key for key in trail if key >= (last_end + 1) * stride)
+                trail.clear()
+            if last_end > i:
+                if last_fa_id >= 0:  # not skipped
+                    out.append((last_fa_id, i, last_end))
+                i = last_end
             else:
-                deque_s.popleft()  # if no match, simply move forward, in order to consume all input
-            while deque_s and deque_s[0] in {" ", "\t", "\n"}:
-                deque_s.popleft()
+                # skip the whole char that failed to match
+                i = i + 1 if b[i] < 0x80 else min(i + decode(b, i, n)[1], n)
+            skip = skip_whitespace
+
+    def _scan_utf8_table_buffer(
+        self,
+        b: BytesLike,
+        i: int,
+        n: int,
+        final: bool,
+        skip: bool,
+        out: List[Tuple[int, int, int]],
+    ) -> Tuple[int, bool]:
+        """
+        Same as `_scan_utf8_buffer`, but steps the byte level DFA of
+        `_compile_utf8_scanner` one byte at a time, without decoding.
+        """
+        start, delta, accept = self._utf8_start, self._utf8_delta, self._utf8_accept
+        assert delta is not None and accept is not None
+        decode = self._decode_utf8
+        stride = len(delta)
+        skip_whitespace = self.skip_ids is None
+        memo: Optional[Set[int]] = set() if self.SCAN_MEMOIZE else None
+        trail: List[int] = []
+        while True:
+            if skip:
+                while i < n and b[i] in b" \t\n":
+                    i += 1
+            if i >= n:
+                return i, skip
+            cur, j = start, i
+            last_fa_id, last_end = -1, i
+            while True:
+                if accept[cur] != -1:
+                    last_fa_id, last_end = accept[cur], j
+                if j == n:
+                    break
+                nxt = delta[cur + b[j]]
+                if nxt < 0:
+                    break
+                cur = nxt
+                j += 1
+                if memo is not None:
+                    if j * stride + cur in memo:
+                        break
+                    trail.append(j * stride + cur)
+            if j == n and not final:
+                return i, False
+            if memo is not None:
+                # only what was read past the last accept failed
+                memo.update(key for key in trail if key >= (last_end + 1) * stride)
+                trail.clear()
+            # accepts are only reached at char boundaries, so tokens start at one too
+            if last_end > i:
+                if last_fa_id >= 0:  # not skipped
+                    out.append((last_fa_id, i, last_end))
+                i = last_end
+            else:
+                # skip the whole char that failed to match
+                i = i + 1 if b[i] < 0x80 else min(i + decode(b, i, n)[1], n)
+            skip = skip_whitespace
+
+    def scan_bytes_spans(self, b: BytesLike) -> Iterable[Tuple[int, int, int]]:
+        """
+        Scan UTF-8 encoded `b` (bytes, memoryview, mmap, ...) without decoding it,
+        yielding `(id, start, end)` byte offsets for each token. Yields the same
+        tokens as `scan_spans` would on the decoded text.
+
+        Uses the byte level scanner if this LangDef has one (see `__init__`), and
+        decodes one non-ASCII char at a time otherwise. Both skip ill-formed bytes
+        alike, except that only the decoding scanner lets overlong encodings and
+        encoded surrogates stand for the code points they spell.
+        """
+        out: List[Tuple[int, int, int]] = []
+        i, n, skip = 0, len(b), False
+        window = self.SCAN_WINDOW
+        scan_buffer = (
+            self._scan_utf8_buffer
+            if self._utf8_delta is None
+            else self._scan_utf8_table_buffer
+        )
+        while i < n:
+            end = min(i + window, n)
+            nxt, skip = scan_buffer(b, i, end, end == n, skip, out)
+            yield from out
+            out.clear()
+            window = self.SCAN_WINDOW if nxt > i else window * 2
+            i = nxt
+
+    def scan_file(self, path: str | os.PathLike) -> Iterable[Tuple[int, int, int]]:
+        """
+        Memory-map a UTF-8 file and scan it in place, yielding `(id, start, end)`
+        byte offsets for each token. Pages are only touched as the scanner reaches
+        them, so files larger than RAM can be tokenized with a flat memory usage.
+        """
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return  # empty files can't be mapped
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                yield from self.scan_bytes_spans(mm)
+
+    @staticmethod
+    def _shard_bounds(
+        find: Callable[[int], int], size: int, sep_len: int, shard_size: int
+    ) -> Iterable[Tuple[int, int]]:
+        # cut right after the first separator found past every `shard_size`
+        start = 0
+        while start < size:
+            end = find(start + shard_size) if start + shard_size < size else -1
+            end = size if end < 0 else end + sep_len
+            yield start, end
+            start = end
+
+    @staticmethod
+    def _map_in_order(
+        executor: Executor, fn: Callable, args: Iterable[Tuple], ahead: int
+    ) -> Iterable[Any]:
+        # like executor.map, but only keeps `ahead` tasks in flight
+        pending: Deque[Future] = deque()
+        for arg in args:
+            pending.append(executor.submit(fn, *arg))
+            if len(pending) >= ahead:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+    def scan_parallel(
+        self,
+        text_or_path: Optional[str | os.PathLike] = None,
+        split_on: str = "\n",
+        workers: Optional[int] = None,
+        shard_size: int = 1 << 20,
+        *,
+        path: Optional[str | os.PathLike] = None,
+    ) -> Iterable[Tuple[int, str]]:
+        """
+        Scan with a pool of `workers` processes, yielding the same tokens as `scan`.
+
+        A str `text_or_path` is always the text to scan, never a file name. To scan
+        a UTF-8 file, pass an `os.PathLike` (e.g. `pathlib.Path`) instead, or any
+        path as `path=`, and workers read their own shard of it. Shards are about
+        `shard_size` long, and always end right after a `split_on`, so this is only
+        exact when no token can contain `split_on`, e.g. newline-separated records.
+        Results are merged back in input order.
+        """
+        if (text_or_path is None) == (path is None):
+            raise TypeError("scan_parallel takes either text_or_path or path")
+        if isinstance(text_or_path, os.PathLike):
+            path = text_or_path
+        workers = workers or os.cpu_count() or 1
+        if path is not None:
+            path = os.fspath(path)
+            sep = split_on.encode("utf-8")
+            shards: Iterable[Tuple] = []
+            with open(path, "rb") as f:
+                size = os.fstat(f.fileno()).st_size
+                if size:  # empty files can't be mapped
+                    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                        shards = [
+                            (path, start, end)
+                            for start, end in self._shard_bounds(
+                                lambda i: mm.find(sep, i), size, len(sep), shard_size
+                            )
+                        ]
+            fn = _scan_file_shard
+        else:
+            text = text_or_path
+            assert isinstance(text, str)
+            shards = (
+                (text[start:end],)
+                for start, end in self._shard_bounds(
+                    lambda i: text.find(split_on, i),
+                    len(text),
+                    len(split_on),
+                    shard_size,
+                )
+            )
+            fn = _scan_text_shard
+        with ProcessPoolExecutor(
+            workers,
+            initializer=_init_scan_worker,
+            initargs=(self.dfa_set_json, self.skip_ids, self.SCAN_MEMOIZE),
+        ) as executor:
+            for tokens in self._map_in_order(executor, fn, shards, workers * 2):
+                yield from tokens
+        yield -1, "$"
+
+    def scan(self, s: str) -> Iterable[Tuple[int, str]]:
+        for id, start, end in self.scan_spans(s):
+            yield id, s[start:end]
+        yield -1, "$"
+
+    def scan_stream(
+        self,
+        stream: IO[str] | Iterable[str],
+        chunk_size: int = 1 << 16,
+        max_token: Optional[int] = None,
+    ) -> Iterable[Tuple[int, str]]:
+        """
+        Scan text that arrives incrementally, e.g. from a file object (anything with
+        `read`), or any iterable of str chunks. Yields the same tokens as `scan` would
+        on the concatenated input, including tokens that straddle chunk boundaries.
+        Only the unfinished token and the chunks read since it started are held in
+        memory. A file object ends at the first empty read. Raises TypeError on bytes
+        chunks, e.g. from a file opened in binary mode.
+
+        An unfinished token is scanned again from its start once more input comes
+        in. To keep long tokens (e.g. an unclosed string literal) linear rather than
+        quadratic, that only happens once the input read since is as long as the
+        token, like the window of `scan_spans` doubles. If `max_token` is given, a
+        ValueError is raised as soon as an unfinished token grows longer than it,
+        which bounds memory to about twice `max_token` plus a chunk.
+        """
+        if hasattr(stream, "read"):
+
+            def read_chunks(stream: IO[str]) -> Iterable[str]:
+                # any empty read ends the stream, e.g. b"" or None
+                while chunk := stream.read(chunk_size):
+                    yield chunk
+
+            chunks = read_chunks(stream)
+        else:
+            chunks = iter(stream)
+        out: List[Tuple[int, int, int]] = []
+        buffer, i, skip = "", 0, False
+        pending: List[str] = []  # chunks read since the last scan
+        pending_size = 0
+        for chunk in chunks:
+            if not isinstance(chunk, str):
+                raise TypeError(
+                    "scan_stream reads str, not %s, see scan_bytes_spans for bytes"
+                    % type(chunk).__name__
+                )
+            if not chunk:
+                continue
+            pending.append(chunk)
+            pending_size += len(chunk)
+            if pending_size < len(buffer) - i:
+                continue  # wait until the unfinished token can double
+            buffer = buffer[i:] + "".join(pending)
+            pending.clear()
+            pending_size = 0
+            i, skip = self._scan_buffer(buffer, 0, len(buffer), False, skip, out)
+            for id, start, end in out:
+                yield id, buffer[start:end]
+            out.clear()
+            if max_token is not None and len(buffer) - i > max_token:
+                raise ValueError(
+                    "unfinished token at %r... is longer than %d chars"
+                    % (buffer[i : i + 20], max_token)
+                )
+        buffer = buffer[i:] + "".join(pending)
+        self._scan_buffer(buffer, 0, len(buffer), True, skip, out)
+        for id, start, end in out:
+            yield id, buffer[start:end]
         yield -1, "$"
 
     def parse(
@@ -107,63 +919,187 @@ class LangDef:
         # - stored variables
         # - function names
         # - etc
-        state_stack = [0]
-        node_stack: List[str | Any] = [
-            -1
-        ]  # str -> terminal, Any -> evaluated non_terminal, depends on PT action fn return type
+        return self._parse(tokens, context, [], [])
+
+    def _parse(
+        self,
+        tokens: Iterable[Tuple[int, str]],
+        context: Dict[str, Any],
+        state_stack: List[int],
+        node_stack: List[str | Any],
+    ):
+        # both stacks are reset here, so that callers may reuse them across inputs
+        action, num_term = self._action, self._num_term
+        goto, num_nt = self._goto, self._num_nt
+        prod_nargs, prod_lhs, prod_fn = self._prod_nargs, self._prod_lhs, self._prod_fn
+
+        state_stack[:] = (0,)
+        # str -> terminal, Any -> evaluated non_terminal, depends on PT action fn return type
+        node_stack[:] = (-1,)
 
         for token_type, lex_str in tokens:
-            current_state = state_stack[-1]
+            column = token_type + 1
+            if not 0 <= column < num_term:
+                continue  # unknown token, same as an error entry
+            state = state_stack[-1]
             while True:
-                if (
-                    self.action_json["table"][current_state].get(str(token_type), None)
-                    is None
-                ):
-                    break
-                action_type, next_state = self.action_json["table"][current_state][
-                    str(token_type)
-                ]
-                if action_type == 0:  # shift to another state
-                    state_stack.append(next_state)
+                act = action[state * num_term + column]
+                if act > 0:  # shift to another state
+                    state_stack.append(act - 1)
                     node_stack.append(lex_str)
                     break
-                elif action_type == 1:
-                    prod_id: int = next_state
-                    nargs, non_terminal = self.prod_id_to_narg_and_non_terminal[
-                        str(prod_id)
-                    ]
-                    fn = self.prod_id_to_fn[str(prod_id)]
-                    args = []
-                    for _ in range(nargs):
+                elif act < -1:  # reduce
+                    prod_id = -act - 1
+                    nargs = prod_nargs[prod_id]
+                    if nargs == 1:  # unit productions are the most common ones
+                        node_stack[-1] = prod_fn[prod_id](context, node_stack[-1])
                         state_stack.pop()
-                        args.append(node_stack.pop())
-                    args.append(context)
-                    args.reverse()
-
-                    current_state = state_stack[-1]
-                    next_state = self.goto_json["table"][current_state][non_terminal]
-                    state_stack.append(next_state)
-                    node_stack.append(fn(*args))
-                    current_state = state_stack[-1]
-                    continue
-                elif action_type == 2:
+                    elif nargs:
+                        args = node_stack[-nargs:]
+                        del node_stack[-nargs:]
+                        del state_stack[-nargs:]
+                        node_stack.append(prod_fn[prod_id](context, *args))
+                    else:
+                        node_stack.append(prod_fn[prod_id](context))
+                    state = goto[state_stack[-1] * num_nt + prod_lhs[prod_id]]
+                    state_stack.append(state)
+                else:  # accept, or no action
                     break
-                else:
-                    assert False
 
         return node_stack[-1]
 
     def eval(self, in_: str, context: Dict[str, Any] = dict()) -> Any:
         return self.parse(self.scan(in_), context)
 
+    def eval_many(
+        self,
+        inputs: Iterable[str],
+        context_factory: Callable[[], Dict[str, Any]] = dict,
+    ) -> List[Any]:
+        """
+        Evaluate many (usually short) inputs, each with a fresh `context_factory()`.
+        The compiled tables, the span buffer and both parse stacks are shared by all
+        inputs, so there's no generator or stack setup per input.
+
+        Returns a list of results in input order. If an input raises an exception,
+        the exception object takes its place in the list, and evaluation goes on.
+        """
+        results: List[Any] = []
+        spans: List[Tuple[int, int, int]] = []
+        state_stack: List[int] = []
+        node_stack: List[str | Any] = []
+        eof = (-1, "$")
+        for in_ in inputs:
+            try:
+                self._scan_buffer(in_, 0, len(in_), True, False, spans)
+                tokens = [(id, in_[start:end]) for id, start, end in spans]
+                tokens.append(eof)
+                spans.clear()
+                results.append(
+                    self._parse(tokens, context_factory(), state_stack, node_stack)
+                )
+            except Exception as e:
+                spans.clear()
+                results.append(e)
+        return results
+
+    def load_productions(self, ref: str):
+        """
+        Register production functions by calling an importable `ref` of the form
+        "package.module:function" with this LangDef, e.g. a function that applies
+        `production` decorators to `ld`. Unlike decorating directly, productions
+        loaded this way survive pickling even if they are closures, see
+        `eval_parallel`.
+        """
+        module, _, name = ref.partition(":")
+        before = dict(self.prod_id_to_fn)
+        getattr(importlib.import_module(module), name)(self)
+        self._production_refs.append(ref)
+        for prod_id, function in self.prod_id_to_fn.items():
+            if before.get(prod_id) is not function:
+                self._ref_prod_fns[prod_id] = function
+
+    def __getstate__(self):
+        # the tables may view an mmap, so ship them as `to_bytes` instead. Functions
+        # from `load_productions` are loaded again from their refs, while decorated
+        # ones are pickled by reference, so closures raise instead of getting lost
+        decorated = {
+            prod_id: function
+            for prod_id, function in self.prod_id_to_fn.items()
+            if self._ref_prod_fns.get(prod_id) is not function
+        }
+        return self.to_bytes(), tuple(self._production_refs), decorated
+
+    def __setstate__(self, state):
+        data, production_refs, decorated = state
+        self.__dict__.update(self.from_bytes(data).__dict__)
+        for ref in production_refs:
+            self.load_productions(ref)
+        self.prod_id_to_fn.update(decorated)
+        self._init_prod_fn()
+
+    def __copy__(self) -> "LangDef":
+        lang_def = self.__class__.__new__(self.__class__)
+        lang_def.__setstate__(self.__getstate__())
+        return lang_def
+
+    def __deepcopy__(self, memo) -> "LangDef":
+        memo[id(self)] = lang_def = self.__copy__()
+        return lang_def
+
+    def eval_parallel(
+        self,
+        inputs: Iterable[str],
+        context_factory: Callable[[], Dict[str, Any]] = dict,
+        workers: Optional[int] = None,
+        batch_size: int = 1024,
+    ) -> List[Any]:
+        """
+        Same as `eval_many`, but inputs are sent in batches of `batch_size` to a pool
+        of `workers` processes. Results are gathered back in input order.
+
+        Every worker rebuilds this LangDef from `to_bytes()` and the refs passed to
+        `load_productions`, so all productions must be registered that way, and
+        `context_factory` must be picklable, e.g. a module level function. Raises
+        ValueError if any production function was set by a decorator instead.
+        """
+        if any(
+            self._ref_prod_fns.get(prod_id) is not function
+            for prod_id, function in self.prod_id_to_fn.items()
+        ):
+            raise ValueError(
+                "productions registered with decorators can't be sent to workers, "
+                "use load_productions instead"
+            )
+        workers = workers or os.cpu_count() or 1
+        it = iter(inputs)
+        batches = iter(lambda: list(islice(it, batch_size)), [])
+        results: List[Any] = []
+        with ProcessPoolExecutor(
+            workers, initializer=_init_eval_worker, initargs=(self,)
+        ) as executor:
+            for batch_results in self._map_in_order(
+                executor,
+                _eval_batch,
+                ((batch, context_factory) for batch in batches),
+                workers * 2,
+            ):
+                results.extend(batch_results)
+        return results
+
     def to_json(self):
-        return {
+        obj = {
             "dfa_set_json": self.dfa_set_json,
             "raw_grammar_to_id": self.raw_grammar_to_id,
             "prod_id_to_narg_and_non_terminal": self.prod_id_to_narg_and_non_terminal,
             "action_json": self.action_json,
             "goto_json": self.goto_json,
         }
+        if self.utf8_dfa_set_json is not None:
+            obj["utf8_dfa_set_json"] = self.utf8_dfa_set_json
+        if self.skip_ids is not None:
+            obj["skip_ids"] = self.skip_ids
+        return obj
 
     @classmethod
     def from_json(cls, obj: Dict[str, Any]):
@@ -173,4 +1109,208 @@ class LangDef:
             obj["prod_id_to_narg_and_non_terminal"],
             obj["action_json"],
             obj["goto_json"],
+            obj.get("utf8_dfa_set_json"),
+            obj.get("skip_ids"),
         )
+
+    def to_bytes(self) -> bytes:
+        """
+        Serialize the compiled tables into a versioned binary format:
+
+        - header: magic, version and the number of sections
+        - section table: name, offset and size of every section
+        - "meta": utf-8 json of the strings and scalars, e.g. `raw_grammar_to_id`
+        - one section per table, as little-endian int16 if all values fit, or int32
+          otherwise, aligned to 8 bytes
+
+        Unlike `to_json`, loading it back is a matter of pointing at the tables.
+        """
+        meta = {
+            "raw_grammar_to_id": self.raw_grammar_to_id,
+            "prod_id_to_narg_and_non_terminal": self.prod_id_to_narg_and_non_terminal,
+            "non_terminals": self._non_terminals,
+            "start": self._start,
+            "num_class": self._num_class,
+            "num_term": self._num_term,
+            "num_nt": self._num_nt,
+            "utf8_start": self._utf8_start,
+            "skip_ids": self.skip_ids,
+        }
+        sections = [(b"meta", b"B", json.dumps(meta, separators=(",", ":")).encode())]
+        tables = self._BINARY_TABLES
+        if self._utf8_delta is not None:
+            tables += self._BINARY_UTF8_TABLES
+        for name in tables:
+            values = getattr(self, name)
+            low, high = min(values, default=0), max(values, default=0)
+            typecode = "h" if -(1 << 15) <= low and high < (1 << 15) else "i"
+            table = array(typecode, values)
+            if sys.byteorder != "little":
+                table.byteswap()
+            sections.append(
+                (name.lstrip("_").encode(), typecode.encode(), table.tobytes())
+            )
+
+        def align(offset: int) -> int:
+            return (offset + 7) & ~7
+
+        offset = align(
+            self._BINARY_HEADER.size + self._BINARY_SECTION.size * len(sections)
+        )
+        out = bytearray(
+            self._BINARY_HEADER.pack(
+                self.BINARY_MAGIC, self.BINARY_VERSION, len(sections)
+            )
+        )
+        for name, typecode, data in sections:
+            out += self._BINARY_SECTION.pack(name, typecode, offset, len(data))
+            offset = align(offset + len(data))
+        for _, _, data in sections:
+            out += bytes(align(len(out)) - len(out)) + data
+        return bytes(out)
+
+    @classmethod
+    def from_bytes(cls, data: BytesLike) -> "LangDef":
+        """
+        Load a LangDef written by `to_bytes`. On little-endian machines the tables
+        are not copied but viewed in place, so passing an `mmap` (see `from_file`)
+        only reads pages of the tables when the scanner or parser touches them.
+        The json members are rebuilt from the tables on first access.
+
+        Raises ValueError if `data` is not a serialized LangDef, or is truncated.
+        """
+        view = memoryview(data)
+        if len(view) < cls._BINARY_HEADER.size:
+            raise ValueError("not a serialized LangDef, or truncated")
+        magic, version, num_sections = cls._BINARY_HEADER.unpack_from(view, 0)
+        if magic != cls.BINARY_MAGIC:
+            raise ValueError("not a serialized LangDef")
+        if version != cls.BINARY_VERSION:
+            raise ValueError("unsupported LangDef binary version %d" % version)
+        table_end = cls._BINARY_HEADER.size + num_sections * cls._BINARY_SECTION.size
+        if len(view) < table_end:
+            raise ValueError("truncated LangDef section table")
+        sections: Dict[bytes, Tuple[str, memoryview]] = {}
+        for k in range(num_sections):
+            name, typecode, offset, size = cls._BINARY_SECTION.unpack_from(
+                view, cls._BINARY_HEADER.size + k * cls._BINARY_SECTION.size
+            )
+            if offset + size > len(view):
+                raise ValueError("truncated LangDef section %r" % name.rstrip(b"\0"))
+            sections[name.rstrip(b"\0")] = (
+                typecode.decode(),
+                view[offset : offset + size],
+            )
+
+        lang_def = cls.__new__(cls)
+        lang_def._mapping = None
+        meta = json.loads(bytes(sections[b"meta"][1]))
+        lang_def._dfa_set_json = lang_def._action_json = lang_def._goto_json = None
+        lang_def.raw_grammar_to_id = meta["raw_grammar_to_id"]
+        lang_def.prod_id_to_narg_and_non_terminal = meta[
+            "prod_id_to_narg_and_non_terminal"
+        ]
+        lang_def.prod_id_to_fn = {}
+        lang_def._production_refs = []
+        lang_def._ref_prod_fns = {}
+        lang_def._non_terminals = meta["non_terminals"]
+        lang_def._start = meta["start"]
+        lang_def._num_class = meta["num_class"]
+        lang_def._num_term = meta["num_term"]
+        lang_def._num_nt = meta["num_nt"]
+        lang_def._utf8_dfa_set_json = None
+        lang_def._utf8_start = meta.get("utf8_start", 0)
+        lang_def.skip_ids = meta.get("skip_ids")
+        lang_def._utf8_delta = lang_def._utf8_accept = None
+        for name in cls._BINARY_TABLES + cls._BINARY_UTF8_TABLES:
+            if name.lstrip("_").encode() not in sections:
+                continue  # no byte level scanner
+            typecode, section = sections[name.lstrip("_").encode()]
+            if sys.byteorder == "little":
+                setattr(lang_def, name, section.cast(typecode))
+            else:
+                table = array(typecode)
+                table.frombytes(section)
+                table.byteswap()
+                setattr(lang_def, name, table)
+        lang_def._init_prod_fn()
+        return lang_def
+
+    @classmethod
+    def from_file(cls, path: str | os.PathLike) -> "LangDef":
+        """
+        Memory-map a file written with `to_bytes` and load it with `from_bytes`.
+
+        The tables point into the map, so it stays open until `close` is called,
+        e.g. by using the returned LangDef as a context manager.
+        """
+        with open(path, "rb") as f:
+            if not os.fstat(f.fileno()).st_size:  # empty files can't be mapped
+                raise ValueError("not a serialized LangDef, %s is empty" % path)
+            mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            lang_def = cls.from_bytes(mapping)
+        except BaseException:
+            mapping.close()
+            raise
+        lang_def._mapping = mapping
+        return lang_def
+
+    def close(self):
+        """
+        Close the file mapped by `from_file`. The scanner and parser tables are
+        copied out first, so this LangDef keeps working. Does nothing for a LangDef
+        that wasn't loaded by `from_file`.
+        """
+        if self._mapping is None:
+            return
+        for name in self._BINARY_TABLES + self._BINARY_UTF8_TABLES:
+            table = getattr(self, name)
+            if isinstance(table, memoryview):
+                setattr(self, name, array(table.format, table))
+                table.release()
+        self._mapping.close()
+        self._mapping = None
+
+    def __enter__(self) -> "LangDef":
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+
+# state of worker processes spawned by `LangDef.scan_parallel` and `eval_parallel`
+_worker_lang_def: Optional[LangDef] = None
+
+
+def _init_scan_worker(
+    dfa_set_json: Dict[str, Any], skip_ids: Optional[List[int]], memoize: bool
+):
+    global _worker_lang_def
+    _worker_lang_def = LangDef(dfa_set_json, {}, {}, {}, {}, skip_ids=skip_ids)
+    _worker_lang_def.SCAN_MEMOIZE = memoize
+
+
+def _scan_text_shard(text: str) -> List[Tuple[int, str]]:
+    assert _worker_lang_def is not None
+    return [
+        (id, text[start:end]) for id, start, end in _worker_lang_def.scan_spans(text)
+    ]
+
+
+def _scan_file_shard(path: str, start: int, end: int) -> List[Tuple[int, str]]:
+    with open(path, "rb") as f:
+        f.seek(start)
+        return _scan_text_shard(f.read(end - start).decode("utf-8"))
+
+
+def _init_eval_worker(lang_def: LangDef):
+    global _worker_lang_def
+    _worker_lang_def = lang_def
+
+
+def _eval_batch(
+    inputs: List[str], context_factory: Callable[[], Dict[str, Any]]
+) -> List[Any]:
+    assert _worker_lang_def is not None
+    return _worker_lang_def.eval_many(inputs, context_factory)
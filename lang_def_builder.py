@@ -1,21 +1,203 @@
 from cfg_utils.cfg import ContextFreeGrammar
+from lr1.action import Action
 from lr1.action_goto_builder import ActionGotoBuilder
+from lr1.closure_templates import ClosureTemplates
+from lr1.goto import Goto
 from lr1.lr1_itemset_automata import LRItemSetAutomata
+from io_utils.json_cache import JsonCache
 from lang_def import LangDef
+import hashlib
+import os
+from typing import Any, Dict, FrozenSet, Literal, Optional, Set, Tuple
 
 
 class LangDefBuilder:
     """A helper class that bridges `LangDef` and dependencies required to generate portable `LangDef` transition table.
     Also helps reduce boilerplate code."""
 
+    # bump whenever the tables generated for the same grammar change
+    CACHE_FORMAT_VERSION = 3
+
+    @staticmethod
+    def cache_key(raw_cfg: str, mode: str = "lr1", utf8: bool = False) -> str:
+        """
+        Hash of the grammar and table construction options, ignoring indentation
+        and blank lines like `ContextFreeGrammar.from_string` does.
+        """
+        lines = (line.strip() for line in raw_cfg.split("\n"))
+        normalized = "\n".join(line for line in lines if line)
+        if utf8:
+            mode += "+utf8"
+        return hashlib.sha256(
+            (
+                "%d\n%s\n%s" % (LangDefBuilder.CACHE_FORMAT_VERSION, mode, normalized)
+            ).encode()
+        ).hexdigest()
+
+    @staticmethod
+    def new(
+        raw_cfg: str,
+        cache_dir: Optional[str | os.PathLike] = None,
+        cache_max_bytes: int = 64 << 20,
+        mode: Literal["lr1", "lalr", "pager"] = "lr1",
+        utf8: bool = False,
+    ) -> LangDef:
+        """
+        Build the `LangDef` of `raw_cfg`. If `cache_dir` is given, the result is
+        stored there, and later calls with the same grammar load it back instead of
+        building it again. The cache is kept under `cache_max_bytes`.
+
+        `mode` selects the item set construction, see `LRItemSetAutomata.new`.
+        "lalr" gives much smaller tables, but may have reduce/reduce conflicts
+        that canonical LR(1) doesn't have. "pager" gives tables about as small
+        without those conflicts.
+
+        If `utf8` is set, a byte level scanner DFA is built as well, and
+        `LangDef.scan_bytes_spans` runs on it instead of decoding its input.
+        """
+        if cache_dir is None:
+            return LangDefBuilder._build(raw_cfg, mode, utf8)
+        cache = JsonCache(cache_dir, cache_max_bytes)
+        key = LangDefBuilder.cache_key(raw_cfg, mode, utf8)
+        obj = cache.get(key)
+        if obj is not None:
+            return LangDef.from_json(obj)
+        lang_def = LangDefBuilder._build(raw_cfg, mode, utf8)
+        cache.put(key, lang_def.to_json())
+        return lang_def
+
     @staticmethod
-    def new(raw_cfg: str) -> LangDef:
+    def _build(
+        raw_cfg: str,
+        mode: Literal["lr1", "lalr", "pager"] = "lr1",
+        utf8: bool = False,
+    ) -> LangDef:
         cfg = ContextFreeGrammar.from_string(raw_cfg)
-        action, goto = ActionGotoBuilder.new(cfg, LRItemSetAutomata.new(cfg))
+        action, goto = ActionGotoBuilder.new(cfg, LRItemSetAutomata.new(cfg, mode))
         return LangDef(
             cfg.typedef.get_dfa_set().to_json(),
             cfg.raw_grammar_to_id,
             cfg.prod_id_to_nargs_and_non_terminal,
             action.to_json(),
             goto.to_json(),
+            cfg.typedef.get_dfa_set(utf8=True).to_json() if utf8 else None,
+            cfg.typedef.skip_ids or None,
+        )
+
+
+class IncrementalLangDefBuilder:
+    """
+    Builds `LangDef`s for successive versions of a grammar, e.g. while it is being
+    edited, and reuses what an edit didn't change:
+
+    - the whole scanner table if the patterns didn't change, and otherwise the
+      minimized DFAs of regexes in `TypeDefinition.dfa_cache`;
+    - the ACTION/GOTO tables if the productions didn't change;
+    - otherwise, the FIRST sets of non-terminals that don't reach a changed
+      production.
+
+    The `cfg`, `first`, `lr_automata`, `action` and `goto` of the last build are
+    kept as attributes.
+    """
+
+    def __init__(self, mode: Literal["lr1", "lalr", "pager"] = "lr1") -> None:
+        self.mode = mode
+        self.cfg: Optional[ContextFreeGrammar] = None
+        self.first: Dict[str, Set[str | int]] = {}
+        self.lr_automata: Optional[LRItemSetAutomata] = None
+        self.action: Optional[Action] = None
+        self.goto: Optional[Goto] = None
+        self.dfa_set_json: Dict[str, Any] = {}
+
+    def build(self, raw_cfg: str) -> LangDef:
+        """
+        Build the `LangDef` of `raw_cfg`. Everything is built before any attribute
+        is replaced, so if a step raises, the builder still holds the last
+        successful build, and the next call compares against that.
+        """
+        cfg = ContextFreeGrammar.from_string(raw_cfg)
+        previous = self.cfg
+        dfa_set_json = self.dfa_set_json
+        first, lr_automata = self.first, self.lr_automata
+        action, goto = self.action, self.goto
+
+        if previous is None or previous.typedef.patterns != cfg.typedef.patterns:
+            dfa_set_json = cfg.typedef.get_dfa_set().to_json()
+
+        if (
+            previous is None
+            or previous.grammar_to_id != cfg.grammar_to_id
+            or previous.start_symbol != cfg.start_symbol
+        ):
+            known = {} if previous is None else self.__unaffected_first(previous, cfg)
+            first = cfg.first(known)
+            lr_automata = LRItemSetAutomata.new(
+                cfg, self.mode, ClosureTemplates.new(cfg, first)
+            )
+            action, goto = ActionGotoBuilder.new(cfg, lr_automata)
+
+        assert action is not None and goto is not None
+        lang_def = LangDef(
+            dfa_set_json,
+            cfg.raw_grammar_to_id,
+            cfg.prod_id_to_nargs_and_non_terminal,
+            action.to_json(),
+            goto.to_json(),
+            skip_ids=cfg.typedef.skip_ids or None,
         )
+
+        self.cfg = cfg
+        self.dfa_set_json = dfa_set_json
+        self.first, self.lr_automata = first, lr_automata
+        self.action, self.goto = action, goto
+        return lang_def
+
+    @staticmethod
+    def __productions_by_name(
+        cfg: ContextFreeGrammar,
+    ) -> Dict[str, FrozenSet[Tuple[str, ...]]]:
+        """
+        Productions of every non-terminal, with terminals as their patterns so
+        that they compare equal across grammars that number patterns differently.
+        """
+        return {
+            non_terminal: frozenset(
+                tuple(
+                    sym if isinstance(sym, str) else cfg.typedef.get_pattern(sym)
+                    for sym in cfg.get_production(production_id)[1]
+                )
+                for production_id in production_ids
+            )
+            for non_terminal, production_ids in cfg.non_terminal_to_prod_id.items()
+        }
+
+    def __unaffected_first(
+        self, previous: ContextFreeGrammar, cfg: ContextFreeGrammar
+    ) -> Dict[str, Set[str | int]]:
+        """
+        FIRST sets of the previous build, for the non-terminals of `cfg` whose
+        productions, and those of every non-terminal they reach, are unchanged.
+        """
+        old = self.__productions_by_name(previous)
+        new = self.__productions_by_name(cfg)
+        affected = {nt for nt in new if old.get(nt) != new[nt]}
+        changed = True
+        while changed:
+            changed = False
+            for non_terminal, productions in new.items():
+                if non_terminal not in affected and any(
+                    sym in affected for seq in productions for sym in seq
+                ):
+                    affected.add(non_terminal)
+                    changed = True
+
+        def translate(sym: str | int) -> str | int:
+            if isinstance(sym, str):
+                return sym
+            return cfg.typedef.get_pattern_id(previous.typedef.patterns[sym][0])
+
+        return {
+            non_terminal: {translate(sym) for sym in self.first[non_terminal]}
+            for non_terminal in new
+            if non_terminal not in affected
+        }
@@ -0,0 +1,96 @@
+from typing import Dict, List, Optional, Self, Tuple
+from collections import deque
+
+from cfg_utils.cfg import ContextFreeGrammar
+from .lr1_item import LRItem
+
+
+class ClosureTemplates:
+    """
+    Everything `LRItemSet.calc_closure` needs about a grammar, precomputed once.
+
+    after_dot:
+        packed core -> (non-terminal at the dot, FIRST of the symbols after it as
+        a look forward bitmask, whether those symbols can derive EMPTY). Only
+        cores with a non-terminal at the dot are present.
+    closure:
+        non-terminal -> list of (packed core, spontaneous bitmask, propagates),
+        the LR(0) closure of the non-terminal. Closing an item whose dot is
+        before the non-terminal, with look forward L, adds every core with
+        look forward `spontaneous | (L if propagates else 0)`, where L is the
+        FIRST of what follows the non-terminal in that item.
+    """
+
+    def __init__(
+        self,
+        after_dot: Dict[int, Tuple[str, int, bool]],
+        closure: Dict[str, List[Tuple[int, int, bool]]],
+    ) -> None:
+        self.after_dot = after_dot
+        self.closure = closure
+
+    @classmethod
+    def new(cls, cfg: ContextFreeGrammar, first_dict: Optional[Dict] = None) -> Self:
+        if first_dict is None:
+            first_dict = cfg.first()
+        after_dot: Dict[int, Tuple[str, int, bool]] = {}
+        for production_id, (_, seq) in cfg.id_to_grammar.items():
+            for dot_pos, sym in enumerate(seq):
+                if cfg.is_non_terminal(sym):
+                    assert isinstance(sym, str)
+                    after_dot[LRItem.pack(production_id, dot_pos)] = (
+                        sym,
+                        *cls.first_of_sequence(cfg, seq[dot_pos + 1 :], first_dict),
+                    )
+        closure = {
+            non_terminal: cls.__closure_of(cfg, non_terminal, after_dot)
+            for non_terminal in cfg.non_terminals
+        }
+        return cls(after_dot, closure)
+
+    @staticmethod
+    def first_of_sequence(
+        cfg: ContextFreeGrammar, seq: Tuple[str | int, ...], first_dict: Dict
+    ) -> Tuple[int, bool]:
+        """
+        FIRST of `seq` as a look forward bitmask, and whether `seq` can derive
+        EMPTY.
+        """
+        bits = 0
+        for sym in seq:
+            if cfg.is_non_terminal(sym):
+                bits |= LRItem.to_bits(first_dict[sym])
+                if cfg.EMPTY not in first_dict[sym]:
+                    return bits, False
+            elif sym != cfg.EMPTY:
+                return bits | LRItem.to_bits((sym,)), False
+        return bits, True
+
+    @staticmethod
+    def __closure_of(
+        cfg: ContextFreeGrammar,
+        non_terminal: str,
+        after_dot: Dict[int, Tuple[str, int, bool]],
+    ) -> List[Tuple[int, int, bool]]:
+        record: Dict[int, Tuple[int, bool]] = {
+            LRItem.pack(production_id, 0): (0, True)
+            for production_id in cfg.get_productions(non_terminal)
+        }
+        que = deque(record)
+        while que:
+            core = que.popleft()
+            if core not in after_dot:
+                continue
+            bits, propagates = record[core]
+            sym, first_bits, nullable = after_dot[core]
+            if nullable:
+                first_bits |= bits
+            propagates = propagates and nullable
+            for production_id in cfg.get_productions(sym):
+                new_core = LRItem.pack(production_id, 0)
+                old_bits, old_propagates = record.get(new_core, (0, False))
+                new = (old_bits | first_bits, old_propagates or propagates)
+                if new_core not in record or new != (old_bits, old_propagates):
+                    record[new_core] = new
+                    que.append(new_core)
+        return [(core, bits, propagates) for core, (bits, propagates) in record.items()]
@@ -1,37 +1,81 @@
 from cfg_utils.cfg import ContextFreeGrammar
-from typing import Set, Optional, Self
+from typing import Iterable, Iterator, Optional, Self, Set, Tuple
 
 
 class LRItem:
     """
     Is in fact a tri-tuple (production id, look forward, dot position)
-    lookForward is a set, containing a set of id of terminals.
+
+    (production id, dot position) is packed into a single int `core`, and the
+    look forward set of terminal ids into an int bitmask `look_forward_bits`,
+    see `pack`, `to_bits` and `from_bits`.
     """
 
-    def __init__(self, production_id: int, look_forward: Set[int], dot_pos: int = 0):
-        self.production_id = production_id
-        self.dot_pos = dot_pos
-        self.look_forward = look_forward  # WARNING: REFERENCE IS SHARED FOR
-        # PERFORMANCE. AVOID EDITING THIS.
-        self.__hash_val: Optional[int] = None
+    DOT_BITS = 16
+    DOT_MASK = (1 << DOT_BITS) - 1
+
+    __slots__ = ("core", "look_forward_bits")
+
+    def __init__(
+        self, production_id: int, look_forward: Iterable[int], dot_pos: int = 0
+    ):
+        self.core = self.pack(production_id, dot_pos)
+        self.look_forward_bits = self.to_bits(look_forward)
+
+    @classmethod
+    def from_packed(cls, core: int, look_forward_bits: int) -> Self:
+        item = cls.__new__(cls)
+        item.core = core
+        item.look_forward_bits = look_forward_bits
+        return item
+
+    @classmethod
+    def pack(cls, production_id: int, dot_pos: int) -> int:
+        return (production_id << cls.DOT_BITS) | dot_pos
+
+    @classmethod
+    def unpack(cls, core: int) -> Tuple[int, int]:
+        return core >> cls.DOT_BITS, core & cls.DOT_MASK
+
+    @staticmethod
+    def to_bits(look_forward: Iterable[int]) -> int:
+        """
+        Terminal ids are dense pattern ids starting from 0, and EOF is -1, so
+        terminal `t` is bit `t + 1`. EMPTY has no bit and is dropped.
+        """
+        bits = 0
+        for sym in look_forward:
+            if sym != ContextFreeGrammar.EMPTY:
+                bits |= 1 << (sym + 1)
+        return bits
+
+    @staticmethod
+    def from_bits(bits: int) -> Iterator[int]:
+        while bits:
+            low = bits & -bits
+            yield low.bit_length() - 2
+            bits ^= low
+
+    @property
+    def production_id(self) -> int:
+        return self.core >> self.DOT_BITS
+
+    @property
+    def dot_pos(self) -> int:
+        return self.core & self.DOT_MASK
+
+    @property
+    def look_forward(self) -> Set[int]:
+        return set(self.from_bits(self.look_forward_bits))
 
     def __eq__(self, other: Self):
         return (
-            self.production_id == other.production_id
-            and self.dot_pos == other.dot_pos
-            and self.look_forward == other.look_forward
+            self.core == other.core
+            and self.look_forward_bits == other.look_forward_bits
         )
 
     def __hash__(self) -> int:
-        if self.__hash_val is None:
-            self.__hash_val = hash(
-                (
-                    self.production_id,
-                    self.dot_pos,
-                    hash(tuple(sorted(list(self.look_forward), key=str))),
-                )
-            )
-        return self.__hash_val
+        return hash((self.core, self.look_forward_bits))
 
     def __str__(self):
         return "(%s, %r, %s)" % (self.production_id, self.look_forward, self.dot_pos)
@@ -40,20 +84,16 @@ class LRItem:
         return repr(str(self))
 
     def __lt__(self, other: Self):
-        """
-        LRItemSet would need static order of LRItem to calculate hash.
-        """
-        if self.production_id == other.production_id:
-            if self.dot_pos == other.dot_pos:
-                return hash(self) < hash(other)
-            return self.dot_pos < other.dot_pos
-        return self.production_id < other.production_id
+        return (self.core, self.look_forward_bits) < (
+            other.core,
+            other.look_forward_bits,
+        )
 
     def get(self, cfg: ContextFreeGrammar, offset=0) -> Optional[str | int]:
         return cfg.get_symbol_in_prod(self.production_id, self.dot_pos, offset)
 
     def move_dot_forward(self):
-        return LRItem(self.production_id, self.look_forward, self.dot_pos + 1)
+        return self.from_packed(self.core + 1, self.look_forward_bits)
 
     def at_end(self, cfg: ContextFreeGrammar) -> bool:
         prod = cfg.get_production(self.production_id)[1]
@@ -1,24 +1,27 @@
-from typing import Set, Dict, Tuple, Self
+from typing import KeysView, Set, Dict, List, Self
 from cfg_utils.cfg import ContextFreeGrammar
+from .closure_templates import ClosureTemplates
 from .lr1_item import LRItem
-from collections import deque
 
 
 class LRItemSet:
+    """
+    Map from packed item core (see `LRItem.pack`) to the look forward bitmask of
+    that core. The hash is the xor of the hashes of all (core, bitmask) pairs,
+    and is kept up to date as items are added.
+    """
+
     def __init__(self):
-        self.items: Set[LRItem] = set()
-        self.__recalc_hash_flag = True  # lazy tag
-        self.__hash_val = None
-        self.__map = {}  # Map "step" to a list of item reference, in order to accelerate.
+        self.cores: Dict[int, int] = {}
+        self.__hash_val = 0
+        # Map "step" to a list of cores, in order to accelerate.
+        self.__map: Dict[str | int, List[int]] = {}
 
     def __hash__(self):
-        if self.__recalc_hash_flag:
-            self.__hash_val = hash(tuple(sorted(list(self.items))))  # TIME COSTING
-            self.__recalc_hash_flag = False
         return self.__hash_val
 
     def __eq__(self, other):
-        return self.items == other.items
+        return self.cores == other.cores
 
     def __str__(self):
         return str(self.items)
@@ -26,77 +29,72 @@ class LRItemSet:
     def __repr__(self) -> str:
         return repr(self.items)
 
+    @property
+    def items(self) -> Set[LRItem]:
+        return {LRItem.from_packed(core, bits) for core, bits in self.cores.items()}
+
     def add_lr_item(self, item: LRItem):
-        if item not in self.items:
-            self.items.add(item)
-            self.__recalc_hash_flag = True
+        self.add(item.core, item.look_forward_bits)
+
+    def add(self, core: int, look_forward_bits: int):
+        """
+        Add item `core` with `look_forward_bits`, merging the look forward
+        bitmask into the item with the same core if there is one.
+        """
+        old = self.cores.get(core)
+        if old is None:
+            self.cores[core] = look_forward_bits
+            self.__hash_val ^= hash((core, look_forward_bits))
+        elif look_forward_bits & ~old:
+            new = old | look_forward_bits
+            self.cores[core] = new
+            self.__hash_val ^= hash((core, old)) ^ hash((core, new))
 
-    def get_next(self, cfg: ContextFreeGrammar) -> Set[int | str]:
+    def get_next(self, cfg: ContextFreeGrammar) -> KeysView[int | str]:
         """
         get all possible out-pointing edges toward other LRItems, which could be later turned into LRItemSets.
+
+        Steps are in the order of the items that have them, so that state
+        numbering doesn't depend on string hashing.
         """
-        result = set()
-        for item in self.items:
-            step = item.get(cfg)
+        self.__map = {}
+        for core in self.cores:
+            step = cfg.get_symbol_in_prod(*LRItem.unpack(core))
             if step is not None and step != "":
-                self.__map.setdefault(step, []).append(item)
-                result.add(step)
-        return result
+                self.__map.setdefault(step, []).append(core)
+        return self.__map.keys()
 
     def goto(self, step):
         """
         return a new LRItemSet.
         """
         result = LRItemSet()
-        for item in self.__map[step]:
-            result.add_lr_item(item.move_dot_forward())
+        for core in self.__map[step]:
+            result.add(core + 1, self.cores[core])
         return result
 
-    def calc_closure(
-        self,
-        cfg: ContextFreeGrammar,
-        first_dict: Dict,
-        seq_to_first_cache: Dict[Tuple[str | int, ...], Set[int]] = dict(),
-    ) -> Self:
+    def calc_closure(self, templates: ClosureTemplates) -> Self:
         """
         Return a new LRItemSet, which is the closure of self.
+
+        Every item with a non-terminal at the dot adds that non-terminal's
+        closure template, so this is a single pass of bitmask unions.
         """
-        que = deque(self.items)
-        record: Dict[Tuple[int, int], Set[int]] = {}
-        while que:
-            cur = que.pop()
-            core = (cur.production_id, cur.dot_pos)
-            record.setdefault(core, set())
-            record[core] |= cur.look_forward
-
-            cur_symbol = cur.get(cfg)  # symbol at current dot position
-
-            if cfg.is_non_terminal(cur_symbol):
-                assert isinstance(cur_symbol, str)
-                non_terminal = cfg.get_production(cur.production_id)[0]
-                prod = cfg.get_production(cur.production_id)[1][cur.dot_pos + 1 :]
-                new_prods = (
-                    prod + (lookForwardSym,) for lookForwardSym in cur.look_forward
-                )  # precalc to accelerate
-
-                for new_prod in new_prods:
-                    if new_prod not in seq_to_first_cache:
-                        first_set = set()
-                        cfg.gen_first_set_of_sequence(
-                            first_set, non_terminal, new_prod, first_dict
-                        )
-                        seq_to_first_cache[new_prod] = first_set
-                    first_set = seq_to_first_cache[new_prod]
-                    for production_id in cfg.get_productions(cur_symbol):
-                        new_id_dot_pair = (production_id, 0)
-                        if new_id_dot_pair not in record or not first_set.issubset(
-                            record[new_id_dot_pair]
-                        ):
-                            que.append(LRItem(production_id, first_set, 0))
+        record = dict(self.cores)
+        for core, bits in self.cores.items():
+            if core not in templates.after_dot:
+                continue
+            non_terminal, first_bits, nullable = templates.after_dot[core]
+            if nullable:
+                first_bits |= bits
+            for new_core, spontaneous, propagates in templates.closure[non_terminal]:
+                record[new_core] = (
+                    record.get(new_core, 0)
+                    | spontaneous
+                    | (first_bits if propagates else 0)
+                )
 
         result = LRItemSet()
-        for (prod_id, dot_pos), v in record.items():
-            result.add_lr_item(
-                LRItem(prod_id, {val for val in v if val != ""}, dot_pos)
-            )
+        for core, bits in record.items():
+            result.add(core, bits)
         return result
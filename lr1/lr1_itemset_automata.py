@@ -1,12 +1,28 @@
-from typing import Self, Tuple, Dict, Deque
+from typing import (
+    Callable,
+    FrozenSet,
+    List,
+    Literal,
+    Optional,
+    Self,
+    Tuple,
+    Dict,
+    Deque,
+    Iterable,
+)
 from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import os
 
 from cfg_utils.cfg import ContextFreeGrammar
+from .closure_templates import ClosureTemplates
 from .lr1_item import LRItem
 from .lr1_itemset import LRItemSet
 
 
 class LRItemSetAutomata:
+    MODES = ("lr1", "lalr", "pager")
+
     def __init__(
         self,
         item_set_to_id: Dict[LRItemSet, int],
@@ -16,18 +32,39 @@ class LRItemSetAutomata:
         self.edges = edges
 
     @classmethod
-    def new(cls, cfg: ContextFreeGrammar) -> Self:
-        cfg_for_first = cfg.remove_left_recursion() if cfg.is_left_recursive() else cfg
-        first_dict = cfg_for_first.first()
+    def new(
+        cls,
+        cfg: ContextFreeGrammar,
+        mode: Literal["lr1", "lalr", "pager"] = "lr1",
+        templates: Optional[ClosureTemplates] = None,
+    ) -> Self:
+        """
+        Build the item set automaton of `cfg`. `templates` defaults to
+        `ClosureTemplates.new(cfg)`.
 
-        init_prod_id = cfg.non_terminal_to_prod_id[cfg.start_symbol][0]
-        init_item = LRItem(init_prod_id, {-1}, 0)
+        mode:
+            "lr1": canonical LR(1) item sets.
+            "lalr": item sets with the same core, i.e. the same set of
+                (production id, dot position) pairs, are merged into one state
+                whose look forward sets are the union of theirs.
+            "pager": like "lalr", but item sets with the same core are only
+                merged if they are weakly compatible (Pager, 1977), so merging
+                never adds a reduce/reduce conflict that canonical LR(1) doesn't
+                have. Tables are about as small as LALR ones.
+        """
+        if mode not in cls.MODES:
+            raise ValueError("unknown mode %r, expected one of %r" % (mode, cls.MODES))
+        if templates is None:
+            templates = ClosureTemplates.new(cfg)
+        init_item_set = cls.__init_item_set(cfg, templates)
 
-        seq_to_first_cache = {}
-
-        init_item_set = LRItemSet()
-        init_item_set.add_lr_item(init_item)
-        init_item_set = init_item_set.calc_closure(cfg, first_dict, seq_to_first_cache)
+        if mode != "lr1":
+            return cls.__new_merged(
+                cfg,
+                templates,
+                init_item_set,
+                cls.weakly_compatible if mode == "pager" else None,
+            )
 
         que: Deque[LRItemSet] = deque([init_item_set])
         edges = {}
@@ -44,9 +81,7 @@ class LRItemSetAutomata:
 
                 if next_item_set_core not in core_to_closure:
                     core_to_closure[next_item_set_core] = (
-                        next_item_set_core.calc_closure(
-                            cfg, first_dict, seq_to_first_cache
-                        )
+                        next_item_set_core.calc_closure(templates)
                     )
                 next_item_set = core_to_closure[next_item_set_core]
 
@@ -58,3 +93,188 @@ class LRItemSetAutomata:
                 )
 
         return cls(item_set_to_id, edges)
+
+    @classmethod
+    def new_parallel(
+        cls, cfg: ContextFreeGrammar, workers: Optional[int] = None
+    ) -> Self:
+        """
+        Same as `new(cfg)`, but the gotos and closures of each BFS level are
+        computed by a pool of `workers` processes. New item sets are numbered
+        in the parent in the same order as `new`, so state ids are the same.
+        """
+        workers = workers or os.cpu_count() or 1
+        templates = ClosureTemplates.new(cfg)
+        init_item_set = cls.__init_item_set(cfg, templates)
+
+        item_set_to_id: Dict[LRItemSet, int] = {init_item_set: 0}
+        edges = {}
+        level = [init_item_set]
+        with ProcessPoolExecutor(
+            workers, initializer=_init_explore_worker, initargs=(cfg, templates)
+        ) as executor:
+            while level:
+                chunk_size = max(1, len(level) // (workers * 4))
+                chunks = [
+                    [item_set.cores for item_set in level[i : i + chunk_size]]
+                    for i in range(0, len(level), chunk_size)
+                ]
+                next_level = []
+                successors = (
+                    successor
+                    for chunk_successors in executor.map(_explore_item_sets, chunks)
+                    for successor in chunk_successors
+                )
+                for cur, cur_successors in zip(level, successors):
+                    for step, cores in cur_successors:
+                        next_item_set = LRItemSet()
+                        for core, bits in cores.items():
+                            next_item_set.add(core, bits)
+                        if next_item_set not in item_set_to_id:
+                            item_set_to_id[next_item_set] = len(item_set_to_id)
+                            next_level.append(next_item_set)
+                        edges.setdefault(item_set_to_id[cur], []).append(
+                            (step, item_set_to_id[next_item_set])
+                        )
+                level = next_level
+
+        return cls(item_set_to_id, edges)
+
+    @staticmethod
+    def __init_item_set(
+        cfg: ContextFreeGrammar, templates: ClosureTemplates
+    ) -> LRItemSet:
+        init_prod_id = cfg.non_terminal_to_prod_id[cfg.start_symbol][0]
+        init_item = LRItem(init_prod_id, {-1}, 0)
+
+        init_item_set = LRItemSet()
+        init_item_set.add_lr_item(init_item)
+        return init_item_set.calc_closure(templates)
+
+    @staticmethod
+    def core_of(item_set: LRItemSet) -> FrozenSet[int]:
+        return frozenset(item_set.cores)
+
+    @staticmethod
+    def weakly_compatible(look_forwards: Dict[int, int], other: Dict[int, int]) -> bool:
+        """
+        Pager's weak compatibility of two states with the same kernel cores. For
+        every pair of kernel items i != j, either the cross look forward sets are
+        disjoint, or i and j already share a look forward symbol in one of the
+        states, in which case canonical LR(1) has the conflict as well.
+        """
+        cores = list(other.keys())
+        for i, core_i in enumerate(cores):
+            for core_j in cores[i + 1 :]:
+                if (
+                    look_forwards[core_i] & other[core_j]
+                    or other[core_i] & look_forwards[core_j]
+                ):
+                    if not (
+                        look_forwards[core_i] & look_forwards[core_j]
+                        or other[core_i] & other[core_j]
+                    ):
+                        return False
+        return True
+
+    @classmethod
+    def __new_merged(
+        cls,
+        cfg: ContextFreeGrammar,
+        templates: ClosureTemplates,
+        init_item_set: LRItemSet,
+        compatible: Optional[Callable[[Dict[int, int], Dict[int, int]], bool]],
+    ) -> Self:
+        """
+        Explore the automaton, merging a goto into a known state with the same
+        core if `compatible(state kernel, goto kernel)` holds, or always if
+        `compatible` is None. When a goto is merged into a state with new look
+        forward symbols, only the new symbols are carried on to its successors.
+        Closure and goto are distributive over item sets, so the new symbols
+        can be followed on their own.
+        """
+        core_to_ids: Dict[FrozenSet[int], List[int]] = {cls.core_of(init_item_set): [0]}
+        # per state: core -> look forward bitmask
+        states: List[Dict[int, int]] = [dict(init_item_set.cores)]
+        edges: Dict[int, Dict[str | int, int]] = {}
+        kernel_to_closure = {}
+
+        # look forward symbols merged into a state but not yet carried on
+        pending: Dict[int, LRItemSet] = {0: init_item_set}
+
+        que: Deque[int] = deque([0])
+        while que:
+            cur_id = que.popleft()
+            cur = pending.pop(cur_id)
+            cur_edges = edges.setdefault(cur_id, {})
+            for step in cur.get_next(cfg):
+                kernel = cur.goto(step)
+                if kernel not in kernel_to_closure:
+                    kernel_to_closure[kernel] = kernel.calc_closure(templates)
+                next_item_set = kernel_to_closure[kernel]
+                if step not in cur_edges:
+                    # the first visit of a state carries all its items, so its
+                    # gotos have full kernels
+                    ids = core_to_ids.setdefault(cls.core_of(next_item_set), [])
+                    if compatible is not None:
+                        ids = [i for i in ids if compatible(states[i], kernel.cores)]
+                    if ids:
+                        cur_edges[step] = ids[0]
+                    else:
+                        core_to_ids[cls.core_of(next_item_set)].append(len(states))
+                        cur_edges[step] = len(states)
+                        states.append({})
+                next_id = cur_edges[step]
+
+                look_forwards = states[next_id]
+                for core, bits in next_item_set.cores.items():
+                    new = bits & ~look_forwards.get(core, 0)
+                    if new or core not in look_forwards:
+                        look_forwards[core] = look_forwards.get(core, 0) | new
+                        if next_id not in pending:
+                            pending[next_id] = LRItemSet()
+                            que.append(next_id)
+                        pending[next_id].add(core, new)
+
+        item_set_to_id = {}
+        for i, look_forwards in enumerate(states):
+            item_set = LRItemSet()
+            for core, bits in look_forwards.items():
+                item_set.add(core, bits)
+            item_set_to_id[item_set] = i
+        return cls(
+            item_set_to_id,
+            {src: list(v.items()) for src, v in edges.items() if v},
+        )
+
+
+# state of worker processes spawned by `LRItemSetAutomata.new_parallel`
+_worker_grammar: Optional[Tuple[ContextFreeGrammar, ClosureTemplates]] = None
+
+
+def _init_explore_worker(cfg: ContextFreeGrammar, templates: ClosureTemplates):
+    global _worker_grammar
+    _worker_grammar = (cfg, templates)
+
+
+def _explore_item_sets(
+    item_sets: Iterable[Dict[int, int]],
+) -> List[List[Tuple[str | int, Dict[int, int]]]]:
+    """
+    For every item set, given as its core -> look forward bitmask dict, the
+    (step, closure of goto) pairs in `get_next` order.
+    """
+    assert _worker_grammar is not None
+    cfg, templates = _worker_grammar
+    result = []
+    for cores in item_sets:
+        cur = LRItemSet()
+        for core, bits in cores.items():
+            cur.add(core, bits)
+        result.append(
+            [
+                (step, cur.goto(step).calc_closure(templates).cores)
+                for step in cur.get_next(cfg)
+            ]
+        )
+    return result
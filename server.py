@@ -4,12 +4,11 @@ Back-end for the visualization of the parsing process
 
 from flask import render_template, Flask, request
 from cfg_utils.cfg import ContextFreeGrammar
-from lr1.action_goto_builder import ActionGotoBuilder
 from lr1.lr1_io import LRPrinter
-from lr1.lr1_itemset_automata import LRItemSetAutomata
 from lang_def import LangDef
-from lang_def_builder import LangDefBuilder
+from lang_def_builder import IncrementalLangDefBuilder
 import os
+import threading
 from typing import List, Tuple
 from server_utils.tree import Tree, TreeNode
 
@@ -18,6 +17,12 @@ app = Flask(__name__, template_folder="./server_utils/templates/")
 
 app.secret_key = os.urandom(16)
 
+# reuses scanner DFAs and FIRST sets between edits of the grammar. The lock is held
+# across a build and the reads of its results, and around the app.config entries
+# set from them, so that a concurrent request can't mix two grammars
+builder = IncrementalLangDefBuilder()
+builder_lock = threading.Lock()
+
 
 @app.route("/")
 def index():
@@ -27,16 +32,15 @@ def index():
 @app.route("/generateLR", methods=["POST"])
 def generate():
     raw_cfg = request.form["CFG"]
-    cfg = ContextFreeGrammar.from_string(raw_cfg)
-    lp = LRPrinter(cfg)
-
-    app.config["cfg"] = cfg
-    app.config["ld"] = LangDefBuilder.new(raw_cfg)
-    app.config["lp"] = lp
-
-    lr_automata = LRItemSetAutomata.new(cfg)
-    item_set_to_id = lr_automata.item_set_to_id
-    action, goto = ActionGotoBuilder.new(cfg, lr_automata)
+    with builder_lock:
+        ld = builder.build(raw_cfg)
+        cfg, first = builder.cfg, builder.first
+        item_set_to_id = builder.lr_automata.item_set_to_id
+        action, goto = builder.action, builder.goto
+        lp = LRPrinter(cfg)
+        app.config["cfg"] = cfg
+        app.config["ld"] = ld
+        app.config["lp"] = lp
 
     terminals, non_terminals = sorted(action.terminals), sorted(goto.non_terminals)
     symbols = terminals + non_terminals
@@ -53,10 +57,8 @@ def generate():
     for k, v in item_set_to_id.items():
         itemToID[lp.to_string(k)] = v
 
-    cfgForFirst = cfg.remove_left_recursion() if cfg.is_left_recursive() else cfg
-    firstDict = cfgForFirst.first()
     firstSet = {
-        k: ", ".join([lp.to_string(sym) for sym in v]) for k, v in firstDict.items()
+        k: ", ".join([lp.to_string(sym) for sym in v]) for k, v in first.items()
     }
 
     return render_template(
@@ -131,9 +133,10 @@ def parse_pt_n_log(
 @app.route("/parse", methods=["POST", "GET"])
 def parse():
     string = request.form["string"]
-    cfg = app.config["cfg"]
-    ld = app.config["ld"]
-    lp = app.config["lp"]
+    with builder_lock:
+        cfg = app.config["cfg"]
+        ld = app.config["ld"]
+        lp = app.config["lp"]
     token_list = ld.scan(string)
     pt, log = parse_pt_n_log(cfg, ld, lp, token_list)
     return {"pt": str(pt), "log": log}
@@ -0,0 +1,90 @@
+import json
+from random import randint
+from dfa_utils.array_automata import ArrayAutomata
+from dfa_utils.finite_automata import FiniteAutomata
+from dfa_utils.finite_automata_set import FiniteAutomataSet
+from dfa_utils.utf8 import utf8_sequences
+
+REGEXES = [
+    r"\"[^\"]*\"",
+    "(-?)(0|[1-9][0-9]*)",
+    "([a-zA-Z]|_)([0-9a-zA-Z]|_)*",
+    "(a|b)*abb(a|b)*",
+    "(ab|a)*(b|ba)+",
+    r"/\*([^*]|\*+[^*/])*\*+/",
+]
+
+
+def dumps(fa) -> str:
+    return json.dumps(fa.to_json())
+
+
+def test_array_automata_conversion():
+    for regex in REGEXES:
+        nfa = FiniteAutomata.from_string(regex)
+        array_nfa = ArrayAutomata.from_fa(nfa)
+        assert dumps(array_nfa) == dumps(nfa)
+        assert dumps(array_nfa.to_fa()) == dumps(nfa)
+        assert dumps(ArrayAutomata.from_json(nfa.to_json())) == dumps(nfa)
+
+
+def test_array_automata_determinize_and_minimize():
+    for regex in REGEXES:
+        nfa = FiniteAutomata.from_string(regex)
+        array_nfa = ArrayAutomata.from_fa(nfa)
+        dfa = array_nfa.determinize()
+        assert dumps(dfa) == dumps(nfa.determinize())
+        min_dfa = array_nfa.minimize()
+        assert dumps(min_dfa) == dumps(nfa.minimize("hopcroft"))
+        for s in ("abb", '"x"y', "-12", "a_1 ", "/* a ** b */x", "abab", ""):
+            assert min_dfa.match_first(s) == nfa.determinize().match_first(s)
+
+
+def test_array_automata_set():
+    literals = ["if", "in", "int", "<", "<<", "<<="]
+    graph_set = FiniteAutomataSet(
+        [FiniteAutomata.from_literal(literal) for literal in literals]
+        + [FiniteAutomata.from_string(regex) for regex in REGEXES]
+    )
+    array_set = FiniteAutomataSet(
+        [ArrayAutomata.from_literal(literal) for literal in literals]
+        + [ArrayAutomata.from_fa(FiniteAutomata.from_string(r)) for r in REGEXES]
+    )
+    assert dumps(array_set) == dumps(graph_set)
+    assert json.dumps(array_set.fa.to_json()) == dumps(graph_set)
+    assert array_set.match_one("<<= 1") == "<<="
+    assert array_set.match_one("intx") == "intx"
+
+
+def test_utf8_sequences():
+    assert list(utf8_sequences(0x61, 0x3B1)) == [
+        [(0x61, 0x7F)],
+        [(0xC2, 0xCD), (0x80, 0xBF)],
+        [(0xCE, 0xCE), (0x80, 0xB1)],
+    ]
+    for _ in range(200):
+        lo = randint(0, 0x10FFFF)
+        hi = min(lo + randint(0, 1 << randint(0, 20)), 0x10FFFF)
+        for _ in range(20):
+            cp = randint(max(lo - 2, 0), min(hi + 2, 0x10FFFF))
+            if 0xD800 <= cp <= 0xDFFF:
+                continue
+            encoded = chr(cp).encode()
+            matched = [
+                seq
+                for seq in utf8_sequences(lo, hi)
+                if len(seq) == len(encoded)
+                and all(l <= b <= h for (l, h), b in zip(seq, encoded))
+            ]
+            assert len(matched) == (1 if lo <= cp <= hi else 0)
+
+
+def test_array_automata_to_utf8():
+    regexes = REGEXES + ["[\u00e9-\u4e2d]+", "(\U0001f600|x)[^a]"]
+    for regex in regexes:
+        dfa = ArrayAutomata.from_fa(FiniteAutomata.from_string(regex)).minimize()
+        byte_dfa = dfa.to_utf8().minimize()
+        for s in ("abb", '"\u00e9"y', "x\U0001f600", "\u4e2d\u00e9\u0100a", ""):
+            # match the encoded bytes as latin-1 chars
+            matched = byte_dfa.match_first(s.encode().decode("latin-1"))
+            assert matched.encode("latin-1").decode() == dfa.match_first(s)
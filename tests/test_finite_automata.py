@@ -4,8 +4,9 @@ from dfa_utils.finite_automata_node import (
     EpsilonTransition,
     Transition,
 )
-from dfa_utils.finite_automata import FiniteAutomata
+from dfa_utils.finite_automata import FiniteAutomata, NFANodeRegexOperation
 from copy import deepcopy
+import json
 
 
 def test_nfa_hash_0():
@@ -603,8 +604,9 @@ def test_dfa_8():
     constructed_dfa = FiniteAutomata.from_string(".*").determinize()
     n0 = FiniteAutomataNode()
     n1 = FiniteAutomataNode()
-    n0.add_edge(Transition(range(ord("\n")), range(ord("\n") + 1, 0x7F)), n1)
-    n1.add_edge(Transition(range(ord("\n")), range(ord("\n") + 1, 0x7F)), n1)
+    max_char = NFANodeRegexOperation.MAX_CHAR
+    n0.add_edge(Transition(range(ord("\n")), range(ord("\n") + 1, max_char)), n1)
+    n1.add_edge(Transition(range(ord("\n")), range(ord("\n") + 1, max_char)), n1)
     expected_dfa = FiniteAutomata(n0, {n0, n1})
     assert hash(constructed_dfa) == hash(expected_dfa)
 
@@ -793,3 +795,117 @@ def test_determinize_split_by_0():
     expected_dfa = FiniteAutomata(n0135, {n27, n47, n247, n67, n2467})
 
     assert hash(constructed_dfa) == hash(expected_dfa)
+
+
+def test_determinize_epsilon_cycles_and_overlapping_ranges():
+    # (a*)* has an ϵ cycle, and [^"] overlaps [a-z] and [0-9]
+    dfa = FiniteAutomata.from_string(r"(a*)*b|[^\"]*x|[a-z][0-9]", determinize=True)
+    assert dfa.to_json()["num_node"] == 10
+    for s, expected in (
+        ("aab", "aab"),
+        ("b", "b"),
+        ("a1x", "a1x"),
+        ("a1", "a1"),
+        ("zzx", "zzx"),
+        ('ab"x', "ab"),
+        ("", ""),
+    ):
+        assert dfa.match_first(s) == expected
+
+
+def test_unicode_ranges():
+    dot = FiniteAutomata.from_string("a.b", minimize=True)
+    assert dot.match_first("a\u00e9b") == "a\u00e9b"
+    assert dot.match_first("a\U0001f600b") == "a\U0001f600b"
+    assert dot.match_first("a\nb") == ""
+    string = FiniteAutomata.from_string(r"\"[^\"]*\"", minimize=True)
+    literal = '"gr\u00fc\u00dfe \u2713"'
+    assert string.match_first(literal + " x") == literal
+    greek = FiniteAutomata.from_string("[\u03b1-\u03c9]+", minimize=True)
+    assert greek.match_first("\u03bb\u03b1x") == "\u03bb\u03b1"
+    # unsorted and overlapping ranges in a complement
+    not_az = FiniteAutomata.from_string("[^za-cb-d]+", minimize=True)
+    assert not_az.match_first("xy\u00e9az") == "xy\u00e9"
+
+
+def test_regex_escapes():
+    space = FiniteAutomata.from_string(r"\s+", minimize=True)
+    assert space.match_first(" \t\r\nx") == " \t\r\n"
+    comment = FiniteAutomata.from_string(r"#[^\n]*\n", minimize=True)
+    assert comment.match_first("# a b\nc") == "# a b\n"
+    assert comment.match_first("# a b") == ""
+    not_space = FiniteAutomata.from_string(r"[^\s\\]+", minimize=True)
+    assert not_space.match_first("ab\u00e9\\c") == "ab\u00e9"
+    assert not_space.match_first("ab\tc") == "ab"
+    # other escaped chars stand for themselves
+    assert FiniteAutomata.from_string(r"\*\q", minimize=True).match_first("*q") == "*q"
+
+
+def test_fa_from_json():
+    fa = FiniteAutomata.from_string(r"\"[^\"]*\"|(-?)[1-9][0-9]*", minimize=True)
+    restored = FiniteAutomata.from_json(json.loads(json.dumps(fa.to_json())))
+    assert json.dumps(restored.to_json()) == json.dumps(fa.to_json())
+    for s in ('"abc" 1', "-15a", "0"):
+        assert restored.match_first(s) == fa.match_first(s)
+
+
+def test_min_dfa_cache(tmp_path, monkeypatch):
+    from dfa_utils.dfa_cache import MinDfaCache
+
+    regexes = ["[a-z]+", "(-?)[1-9][0-9]*", r"\"[^\"]*\""]
+    cache = MinDfaCache(max_entries=2, directory=tmp_path)
+    for r in regexes:
+        assert json.dumps(cache.get(r).to_json()) == json.dumps(
+            FiniteAutomata.from_string(r, minimize=True).to_json()
+        )
+    assert list(cache.entries) == regexes[1:]
+    assert len(list(tmp_path.iterdir())) == 3
+
+    def no_build(*_, **__):
+        raise AssertionError("cache miss")
+
+    monkeypatch.setattr(FiniteAutomata, "from_string", no_build)
+    assert cache.get(regexes[1]) is not cache.get(regexes[1])
+    assert list(cache.entries) == [regexes[2], regexes[1]]
+    assert MinDfaCache(directory=tmp_path).get(regexes[0]).match_first("ab1") == "ab"
+
+
+def test_hopcroft_minimize():
+    for regex, num_node in (
+        ("(a|b)*abb", 4),
+        ("a*b*a*", 3),
+        ("(-?)[1-9][0-9]*|0", 4),
+        (r"\"[^\"]*\"", 3),
+        ("([a-zA-Z]|_)([a-zA-Z]|[0-9]|_)*", 2),
+    ):
+        brzozowski = FiniteAutomata.from_string(regex, minimize=True)
+        hopcroft = FiniteAutomata.from_string(regex).minimize("hopcroft")
+        assert hopcroft.to_json()["num_node"] == num_node
+        for s in ("aabb", "babba", "abab", "-120", "0", '"ab"c', "_a1 b", ""):
+            assert hopcroft.match_first(s) == brzozowski.match_first(s)
+
+
+def test_hopcroft_minimize_keeps_fa_id():
+    from dfa_utils.finite_automata_set import FiniteAutomataSet
+
+    keywords = FiniteAutomataSet(
+        [
+            FiniteAutomata.from_literal("if"),
+            FiniteAutomata.from_literal("in"),
+            FiniteAutomata.from_string("[a-z]+", minimize=True),
+        ]
+    )
+    minimized = keywords.fa.hopcroft_minimize()
+    assert minimized.to_json() == keywords.fa.to_json()  # already minimal
+
+    # the keywords can never win over identifiers, so they are merged away
+    shadowed = FiniteAutomataSet(
+        [
+            FiniteAutomata.from_string("[a-z]+", minimize=True),
+            FiniteAutomata.from_literal("if"),
+            FiniteAutomata.from_literal("in"),
+        ]
+    )
+    assert shadowed.fa.to_json()["num_node"] == 2
+    assert shadowed.fa.to_json()["fa_id"] == [None, 0]
+    assert shadowed.match_one("in") == "in"
@@ -1,6 +1,11 @@
+import copy
+import io
+from collections import deque
 from dataclasses import dataclass
 import json
+import pickle
 from typing import Optional
+import lang_def as lang_def_module
 from lang_def import LangDef
 from lang_def_builder import LangDefBuilder
 from cfg_utils.type_def import TypeDefinition
@@ -358,6 +363,288 @@ def test_ld_scanner_with_undefined_char_1():
     ) == [(char_to_id.get(c, 5), c) for c in "3+5*(5-7)"] + [(-1, "$")]
 
 
+def test_ld_scanner_table_matches_match_one():
+    # the compiled transition table must emit exactly what walking the json does
+    typedef = TypeDefinition()
+    typedef.add_definition("ab")
+    typedef.add_definition("abcd")
+    typedef.add_definition("<<=")
+    typedef.add_definition("<")
+    typedef.add_definition(r"\"[^\"]*\"", True)
+    typedef.add_definition("[a-c]+", True)
+    ld = LangDef(typedef.get_dfa_set().to_json(), {}, {}, {}, {})
+
+    def reference_scan(s: str):
+        deque_s = deque(s)
+        while deque_s:
+            (id, word) = LangDef.match_one(ld.dfa_set_json, deque_s)
+            if word:
+                yield id, word
+            elif deque_s:
+                deque_s.popleft()
+            while deque_s and deque_s[0] in {" ", "\t", "\n"}:
+                deque_s.popleft()
+        yield -1, "$"
+
+    alphabet = 'abcd<= "\n\tx\u00e9\u4e2d'
+    for _ in range(200):
+        in_ = "".join(alphabet[randint(0, len(alphabet) - 1)] for _ in range(30))
+        assert list(ld.scan(in_)) == list(reference_scan(in_))
+
+
+def test_ld_scan_rescan_after_last_accept():
+    typedef = TypeDefinition()
+    typedef.add_definition("a")
+    typedef.add_definition("a*b", True)
+    typedef.add_definition("<<=")
+    typedef.add_definition("<")
+    typedef.add_definition(r"\"[^\"]*\"", True)
+    args = (typedef.get_dfa_set().to_json(), {}, {}, {}, {})
+    ld = LangDef(*args)
+    utf8_ld = LangDef(*args, typedef.get_dfa_set(utf8=True).to_json())
+
+    # chars read past the last accept are scanned again, not dropped
+    deque_s = deque("aaa")
+    assert LangDef.match_one(ld.dfa_set_json, deque_s) == (0, "a")
+    assert "".join(deque_s) == "aa"
+    deque_s = deque('"<')
+    assert LangDef.match_one(ld.dfa_set_json, deque_s) == (-1, "")
+    assert "".join(deque_s) == '"<'
+    assert list(ld.scan('aaa aab <<a "<')) == [
+        (0, "a"),
+        (0, "a"),
+        (0, "a"),
+        (1, "aab"),
+        (3, "<"),
+        (3, "<"),
+        (0, "a"),
+        (3, "<"),
+        (-1, "$"),
+    ]
+
+    # memoizing failed (state, position) pairs doesn't change the tokens
+    alphabet = 'aab<= "\n\u00e9'
+    for _ in range(100):
+        in_ = "".join(alphabet[randint(0, len(alphabet) - 1)] for _ in range(60))
+        raw = in_.encode()
+        expected = list(ld.scan(in_)), list(ld.scan_bytes_spans(raw))
+        for lang_def in (ld, utf8_ld):
+            lang_def.SCAN_MEMOIZE = True
+            assert list(lang_def.scan(in_)) == expected[0]
+            assert list(lang_def.scan_bytes_spans(raw)) == expected[1]
+            del lang_def.SCAN_MEMOIZE
+        assert list(utf8_ld.scan_bytes_spans(raw)) == expected[1]
+    ld.SCAN_MEMOIZE = True
+    assert list(ld.scan("a" * 5000)) == [(0, "a")] * 5000 + [(-1, "$")]
+
+
+def test_ld_scan_unicode():
+    typedef = TypeDefinition()
+    typedef.add_definition("=")
+    typedef.add_definition(r"\"[^\"]*\"", True)
+    letter = "([a-zA-Z]|_|[\u00c0-\U0010ffff])"
+    typedef.add_definition("%s(%s|[0-9])*" % (letter, letter), True)
+    typedef.add_definition("#.*", True)
+    ld = LangDef(typedef.get_dfa_set().to_json(), {}, {}, {}, {})
+    in_ = '\u00e9t\u00e9 = "\u4e2d\u6587 \U0001f600" # \u2713 done\nx'
+    assert list(ld.scan(in_)) == [
+        (2, "\u00e9t\u00e9"),
+        (0, "="),
+        (1, '"\u4e2d\u6587 \U0001f600"'),
+        (3, "# \u2713 done"),
+        (2, "x"),
+        (-1, "$"),
+    ]
+    spans = list(ld.scan_bytes_spans(in_.encode()))
+    assert [(id, in_.encode()[l:r].decode()) for id, l, r in spans] == list(
+        ld.scan(in_)
+    )[:-1]
+    # code points above ASCII that behave alike share a class
+    assert ld._num_class <= 12
+
+
+def test_ld_scan_spans():
+    typedef = TypeDefinition()
+    typedef.add_definition("select")
+    typedef.add_definition(",")
+    typedef.add_definition(r"\"[^\"]*\"", True)
+    typedef.add_definition("([a-zA-Z]|_)([a-zA-Z]|[0-9]|_)*", True)
+    ld = LangDef(typedef.get_dfa_set().to_json(), {}, {}, {}, {})
+    in_ = '  select a, "b c",\n\tselected ?d'
+    spans = list(ld.scan_spans(in_))
+    assert spans == [
+        (0, 2, 8),
+        (3, 9, 10),
+        (1, 10, 11),
+        (2, 12, 17),
+        (1, 17, 18),
+        (3, 20, 28),
+        (3, 30, 31),
+    ]
+    words = [(id, in_[start:end]) for id, start, end in spans]
+    assert words + [(-1, "$")] == list(ld.scan(in_))
+
+
+def test_ld_scan_stream():
+    typedef = TypeDefinition()
+    typedef.add_definition("<<=")
+    typedef.add_definition("<")
+    typedef.add_definition("ab")
+    typedef.add_definition("abcd")
+    typedef.add_definition(r"\"[^\"]*\"", True)
+    typedef.add_definition("([a-zA-Z]|_)([a-zA-Z]|[0-9]|_)*", True)
+    ld = LangDef(typedef.get_dfa_set().to_json(), {}, {}, {}, {})
+
+    alphabet = 'abcdx1<= "\n\t\u00e9'
+    for _ in range(100):
+        in_ = "".join(alphabet[randint(0, len(alphabet) - 1)] for _ in range(60))
+        expected = list(ld.scan(in_))
+        cuts = sorted(randint(0, len(in_)) for _ in range(randint(0, 8)))
+        chunks = [in_[l:r] for l, r in zip([0] + cuts, cuts + [len(in_)])]
+        assert list(ld.scan_stream(chunks)) == expected
+        assert list(ld.scan_stream(io.StringIO(in_), chunk_size=3)) == expected
+
+    # tokens that are longer than the scan window of scan_spans
+    ld.SCAN_WINDOW = 2
+    in_ = 'ab "a long literal" abcd <<= identifier'
+    assert list(ld.scan(in_)) == [
+        (2, "ab"),
+        (4, '"a long literal"'),
+        (3, "abcd"),
+        (0, "<<="),
+        (5, "identifier"),
+        (-1, "$"),
+    ]
+
+    # an unclosed literal fed one char at a time is rescanned geometrically
+    in_ = 'ab "' + "x" * 10000
+    scanned = 0
+    scan_buffer = ld._scan_buffer
+
+    def counting_scan_buffer(buffer, i, n, *args):
+        nonlocal scanned
+        scanned += n - i
+        return scan_buffer(buffer, i, n, *args)
+
+    ld._scan_buffer = counting_scan_buffer
+    assert list(ld.scan_stream(in_)) == list(ld.scan(in_))
+    assert scanned < 10 * len(in_)
+    del ld._scan_buffer
+
+    with pytest.raises(ValueError):
+        list(ld.scan_stream(in_, max_token=100))
+    assert list(ld.scan_stream(in_[:50], max_token=100)) == list(ld.scan(in_[:50]))
+
+    assert list(ld.scan_stream(io.StringIO(""))) == [(-1, "$")]
+    assert list(ld.scan_stream(io.BytesIO(b""))) == [(-1, "$")]
+    with pytest.raises(TypeError):
+        list(ld.scan_stream(io.BytesIO(b"ab abcd")))
+    with pytest.raises(TypeError):
+        list(ld.scan_stream([b"ab"]))
+
+
+def test_ld_scan_file(tmp_path):
+    typedef = TypeDefinition()
+    typedef.add_definition("<<=")
+    typedef.add_definition("<")
+    typedef.add_definition(r"\"[^\"]*\"", True)
+    typedef.add_definition("([a-zA-Z]|_)([a-zA-Z]|[0-9]|_)*", True)
+    ld = LangDef(typedef.get_dfa_set().to_json(), {}, {}, {}, {})
+
+    alphabet = 'ab1<= "\n\u00e9\u4e2d\U0001f600'
+    for i in range(50):
+        in_ = "".join(alphabet[randint(0, len(alphabet) - 1)] for _ in range(60))
+        path = tmp_path / ("%d.txt" % i)
+        path.write_text(in_, encoding="utf-8")
+        raw = path.read_bytes()
+        expected = [(id, word) for id, word in ld.scan(in_)][:-1]
+        spans = list(ld.scan_file(path))
+        assert [(id, raw[l:r].decode()) for id, l, r in spans] == expected
+        ld.SCAN_WINDOW = 3  # windows that cut multi-byte chars
+        assert list(ld.scan_bytes_spans(raw)) == spans
+        del ld.SCAN_WINDOW
+
+    empty = tmp_path / "empty.txt"
+    empty.write_bytes(b"")
+    assert list(ld.scan_file(empty)) == []
+    assert list(ld.scan_bytes_spans(b"\xff<\xe4\xb8")) == [(1, 1, 2)]
+
+
+def test_ld_scan_utf8_table():
+    typedef = TypeDefinition()
+    typedef.add_definition("<<=")
+    typedef.add_definition("<")
+    typedef.add_definition("\u00e9\u00e9")
+    typedef.add_definition(r"\"[^\"]*\"", True)
+    letter = "([a-zA-Z]|_|[\u4e00-\u9fff])"
+    typedef.add_definition("%s(%s|[0-9])*" % (letter, letter), True)
+    args = (typedef.get_dfa_set().to_json(), {}, {}, {}, {})
+    ld = LangDef(*args)
+    utf8_ld = LangDef(*args, typedef.get_dfa_set(utf8=True).to_json())
+    assert utf8_ld._utf8_delta is not None and ld._utf8_delta is None
+
+    alphabet = 'ab1<= "\n\u00e9\u4e2d\U0001f600'
+    ill_formed = [b"\xff", b"\x80", b"\xc3", b"\xe4\xb8"]
+    for _ in range(100):
+        in_ = "".join(alphabet[randint(0, len(alphabet) - 1)] for _ in range(60))
+        raw = in_.encode()
+        expected = list(ld.scan_bytes_spans(raw))
+        words = [(id, raw[l:r].decode()) for id, l, r in expected]
+        assert words == list(ld.scan(in_))[:-1]
+        assert list(utf8_ld.scan_bytes_spans(raw)) == expected
+        # ill-formed bytes are skipped the same way by both
+        raw = b"".join(
+            ill_formed[randint(0, 3)] if randint(0, 3) == 0 else c.encode() for c in in_
+        )
+        expected = list(ld.scan_bytes_spans(raw))
+        assert list(utf8_ld.scan_bytes_spans(raw)) == expected
+        utf8_ld.SCAN_WINDOW = 3  # windows that cut multi-byte chars
+        assert list(utf8_ld.scan_bytes_spans(raw)) == expected
+        del utf8_ld.SCAN_WINDOW
+    assert list(utf8_ld.scan_bytes_spans(b"\xff<\xe4\xb8")) == [(1, 1, 2)]
+
+    # the byte level tables survive both serializations
+    loaded = LangDef.from_bytes(utf8_ld.to_bytes())
+    assert loaded.to_bytes() == utf8_ld.to_bytes()
+    assert LangDef.from_json(loaded.to_json()).to_bytes() == utf8_ld.to_bytes()
+    assert LangDef.from_bytes(ld.to_bytes())._utf8_delta is None
+    raw = '<<=\u00e9\u00e9 "\U0001f600" \u4e2d1'.encode()
+    assert list(loaded.scan_bytes_spans(raw)) == list(ld.scan_bytes_spans(raw))
+
+
+def test_ld_scan_parallel(tmp_path):
+    typedef = TypeDefinition()
+    typedef.add_definition("=")
+    typedef.add_definition(r"\"[^\"]*\"", True)
+    typedef.add_definition("([a-zA-Z]|_)([a-zA-Z]|[0-9]|_)*", True)
+    ld = LangDef(typedef.get_dfa_set().to_json(), {}, {}, {}, {})
+
+    in_ = "".join(
+        'key%d = "value %d"  \u00e9\n' % (i, randint(0, 100)) for i in range(300)
+    )
+    expected = list(ld.scan(in_))
+    assert list(ld.scan_parallel(in_, workers=2, shard_size=100)) == expected
+
+    path = tmp_path / "records.txt"
+    path.write_text(in_, encoding="utf-8")
+    assert list(ld.scan_parallel(path, workers=2, shard_size=100)) == expected
+    # a str is always text, so str paths go through path=
+    assert list(ld.scan_parallel(path=str(path), workers=2)) == expected
+    assert list(ld.scan_parallel(str(path), workers=2)) == list(ld.scan(str(path)))
+    with pytest.raises(TypeError):
+        list(ld.scan_parallel(in_, path=path))
+    with pytest.raises(TypeError):
+        list(ld.scan_parallel())
+    path.write_text("", encoding="utf-8")
+    assert list(ld.scan_parallel(path, workers=2)) == [(-1, "$")]
+
+    # workers rebuild the LangDef, but keep an instance-level SCAN_MEMOIZE
+    ld.SCAN_MEMOIZE = True
+    assert list(ld.scan_parallel(in_, workers=2, shard_size=100)) == expected
+    lang_def_module._init_scan_worker(ld.dfa_set_json, ld.skip_ids, ld.SCAN_MEMOIZE)
+    assert lang_def_module._worker_lang_def.SCAN_MEMOIZE
+
+
 @pytest.fixture
 def gen_calc():
     ld = LangDefBuilder.new(
@@ -471,6 +758,316 @@ def test_calc(gen_calc: LangDef):
     assert gen_calc.eval(exp) == val
 
 
+def test_calc_deep(gen_calc: LangDef):
+    exp, val = "1", 1
+    for i in range(300):
+        exp = "(%s %s %d)" % (exp, "+-*"[i % 3], i % 7)
+        val = (add, sub, mul)[i % 3](val, i % 7)
+    assert gen_calc.eval(exp) == val
+
+
+def test_eval_many(gen_calc: LangDef):
+    @gen_calc.production('F -> "(" E ")"')
+    def __par(context, _l, e: int, _r) -> int:
+        context["depth"] = context.get("depth", 0) + 1
+        if context["depth"] > 2:
+            raise RecursionError("too deep")
+        return e
+
+    inputs = ["1 + 2 * 3", "(((1)))", "((4) - 5)", "", "7"]
+    results = gen_calc.eval_many(inputs)
+    assert results[0] == 7
+    assert isinstance(results[1], RecursionError)
+    assert results[2:] == [-1, -1, 7]  # an empty input leaves the bottom marker
+    assert results == [
+        r if isinstance(r, Exception) else gen_calc.eval(in_, {})
+        for in_, r in zip(inputs, results)
+    ]
+
+
+def test_eval_parallel():
+    from examples.calc_parallel import GRAMMAR
+
+    ld = LangDefBuilder.new(GRAMMAR)
+    ld.load_productions("examples.calc_parallel:register")
+    inputs = [
+        "%d %s (%d * %d)" % (randint(-9, 9), "+-"[i % 2], i, randint(0, 9))
+        for i in range(100)
+    ] + ["(1"]
+    expected = ld.eval_many(inputs)
+    assert ld.eval_parallel(inputs, workers=2, batch_size=7) == expected
+    assert ld.eval_parallel([]) == []
+
+    restored = pickle.loads(pickle.dumps(ld))
+    assert restored.eval_many(inputs) == expected
+
+    @ld.production('F -> "(" E ")"')
+    def __par(_, _l, e: int, _r) -> int:
+        return e
+
+    with pytest.raises((pickle.PicklingError, AttributeError)):
+        pickle.dumps(ld)  # a closure can't be pickled, and isn't dropped silently
+    with pytest.raises(ValueError):
+        ld.eval_parallel(inputs)  # mixed refs and decorators
+
+    # reloading the ref registers its functions again
+    ld.load_productions("examples.calc_parallel:register")
+    assert ld.eval_parallel(inputs, workers=2, batch_size=50) == expected
+
+    decorated = LangDefBuilder.new(GRAMMAR)
+    decorated.production("F -> int_const")(lambda _, i: i)
+    with pytest.raises(ValueError):
+        decorated.eval_parallel(inputs)
+
+
+def _negate(_, _m, f: int) -> int:
+    return -f
+
+
+def test_ld_pickle_and_copy():
+    from examples.calc_parallel import GRAMMAR
+
+    ld = LangDefBuilder.new(GRAMMAR.replace('"(" E ")"', '"(" E ")" | "-" F'))
+    ld.load_productions("examples.calc_parallel:register")
+    ld.production('F -> "-" F')(_negate)  # decorated, but importable
+    negate_id = str(ld.raw_grammar_to_id['F -> "-" F'])
+    for restored in (
+        pickle.loads(pickle.dumps(ld)),
+        copy.copy(ld),
+        copy.deepcopy(ld),
+    ):
+        assert restored.prod_id_to_fn.keys() == ld.prod_id_to_fn.keys()
+        assert restored.prod_id_to_fn[negate_id] is _negate
+        assert restored.eval("1 - -(2 * -3)", {}) == -5
+        with pytest.raises(ValueError):
+            restored.eval_parallel(["1"])  # still mixed refs and decorators
+
+
+def test_lang_def_builder_cache(tmp_path, monkeypatch):
+    from examples.calc_parallel import GRAMMAR
+
+    built = LangDefBuilder.new(GRAMMAR, cache_dir=tmp_path)
+    assert len(list(tmp_path.iterdir())) == 1
+
+    def no_build(*_):
+        raise AssertionError("cache miss")
+
+    monkeypatch.setattr(LangDefBuilder, "_build", staticmethod(no_build))
+    reindented = "\n".join("  " + line.strip() for line in GRAMMAR.split("\n"))
+    cached = LangDefBuilder.new(reindented + "\n\n", cache_dir=tmp_path)
+    assert cached.to_json() == json.loads(json.dumps(built.to_json()))
+    for ld in (built, cached):
+        ld.load_productions("examples.calc_parallel:register")
+    assert cached.eval("1 + 2 * (3 - 4)", {}) == built.eval("1 + 2 * (3 - 4)", {})
+
+    with pytest.raises(AssertionError):
+        LangDefBuilder.new(GRAMMAR.replace('"*"', '"/"'), cache_dir=tmp_path)
+
+
+def test_lang_def_builder_lalr():
+    from examples.calc_parallel import GRAMMAR, register
+
+    lr1 = LangDefBuilder.new(GRAMMAR)
+    lalr = LangDefBuilder.new(GRAMMAR, mode="lalr")
+    assert lalr.action_json["state_count"] < lr1.action_json["state_count"]
+    for ld in (lr1, lalr):
+        register(ld)
+    exp = "1"
+    for i in range(100):
+        exp = "(%s %s %d)" % (exp, "+-*"[i % 3], i % 7)
+        assert lalr.eval(exp, {}) == lr1.eval(exp, {})
+    assert LangDefBuilder.cache_key(GRAMMAR) != LangDefBuilder.cache_key(
+        GRAMMAR, "lalr"
+    )
+    with pytest.raises(ValueError):
+        LangDefBuilder.new(GRAMMAR, mode="slr")
+
+
+def test_lang_def_skip_patterns():
+    grammar = r"""
+        START -> E
+        E -> E "+" T | T
+        T -> T "*" F | F
+        F -> int_const
+        int_const -> r"0|[1-9][0-9]*"
+        %skip -> r"\s+" | r"#[^\n]*" | r"/\*([^*]|\*+[^*/])*\*+/"
+        """
+    ld = LangDefBuilder.new(grammar, utf8=True)
+    assert len(ld.skip_ids) == 3
+    assert "%skip" not in str(ld.raw_grammar_to_id)
+
+    @ld.production("E -> T", "T -> F", "F -> int_const")
+    def __identity(_, e: int) -> int:
+        return e
+
+    @ld.production('E -> E "+" T')
+    def __add(_, e: int, _p: str, t: int) -> int:
+        return e + t
+
+    @ld.production('T -> T "*" F')
+    def __mul(_, t: int, _m: str, f: int) -> int:
+        return t * f
+
+    @ld.production('int_const -> r"0|[1-9][0-9]*"')
+    def __int(_, int_const: str) -> int:
+        return int(int_const)
+
+    in_ = "1 + # one\r\n2 /* two ** */*\t3/**/+4 # end"
+    assert [word for _, word in ld.scan(in_)] == list("1+2*3+4") + ["$"]
+    assert ld.eval(in_) == 11
+    raw = in_.encode()
+    assert list(ld.scan_bytes_spans(raw)) == list(ld.scan_spans(in_))
+    loaded = LangDef.from_bytes(ld.to_bytes())
+    for loaded in (loaded, LangDef.from_json(loaded.to_json())):
+        assert loaded.skip_ids == ld.skip_ids
+        assert list(loaded.scan(in_)) == list(ld.scan(in_))
+        assert list(loaded.scan_bytes_spans(raw)) == list(ld.scan_spans(in_))
+        # skipped patterns keep their ids when decompiled
+        assert loaded.dfa_set_json["fa_id"] == ld.dfa_set_json["fa_id"]
+
+    # without %skip lines, whitespace is skipped between tokens as before
+    assert LangDefBuilder.new(grammar.replace("%skip", "X")).skip_ids is None
+    with pytest.raises(ValueError):
+        LangDefBuilder.new(grammar.replace(r'r"\s+"', '"+"'))
+
+
+def test_incremental_lang_def_builder():
+    from examples.calc_parallel import GRAMMAR, register
+    from lang_def_builder import IncrementalLangDefBuilder
+
+    builder = IncrementalLangDefBuilder()
+    builder.build(GRAMMAR)
+    dfa_set_json, action = builder.dfa_set_json, builder.action
+
+    edited = GRAMMAR.replace('T -> T "*" F | F', 'T -> T "*" F | T "/" F | F')
+    ld = builder.build(edited)
+    assert builder.action is not action
+    assert builder.first == builder.cfg.first()
+    assert ld.to_json() == LangDefBuilder.new(edited).to_json()
+    register(ld)
+    assert ld.eval("(1 + 2) * 3", {}) == 9
+
+    hex_edit = edited.replace("[1-9][0-9]*", "[1-9][0-9]*|0x[0-9a-f]+")
+    dfa_set_json, action = builder.dfa_set_json, builder.action
+    ld = builder.build(hex_edit)
+    assert builder.action is action  # only the scanner changed
+    assert builder.dfa_set_json is not dfa_set_json
+    assert json.dumps(ld.to_json(), sort_keys=True) == json.dumps(
+        LangDefBuilder.new(hex_edit).to_json(), sort_keys=True
+    )
+
+    dfa_set_json = builder.dfa_set_json
+    builder.build(hex_edit.replace("START -> E", "START -> E | E E"))
+    assert builder.dfa_set_json is dfa_set_json  # same patterns
+
+    # regexes come from the shared cache, and reverting an edit gives the same
+    # tables as a fresh build, so no cached DFA was modified by an earlier build
+    assert "0|(-?)[1-9][0-9]*|0x[0-9a-f]+" in TypeDefinition.dfa_cache.entries
+    for raw_cfg in (edited, hex_edit.replace('"+"', '"plus"'), hex_edit):
+        assert json.dumps(builder.build(raw_cfg).to_json(), sort_keys=True) == (
+            json.dumps(LangDefBuilder.new(raw_cfg).to_json(), sort_keys=True)
+        )
+
+
+def test_incremental_lang_def_builder_failed_build():
+    from examples.calc_parallel import GRAMMAR, register
+    from lang_def_builder import IncrementalLangDefBuilder
+
+    builder = IncrementalLangDefBuilder()
+    builder.build(GRAMMAR)
+    cfg, dfa_set_json, action = builder.cfg, builder.dfa_set_json, builder.action
+
+    # a failed build leaves the last good one in place, so retrying fails again
+    bad = GRAMMAR.replace('T -> T "*" F | F', 'T -> T "*" F | T "/" F | F').replace(
+        "0|(-?)[1-9][0-9]*", "[0-"
+    )
+    for _ in range(2):
+        with pytest.raises(IndexError):
+            builder.build(bad)
+        assert builder.cfg is cfg
+        assert builder.dfa_set_json is dfa_set_json and builder.action is action
+
+    fixed = bad.replace("[0-", "0|(-?)[1-9][0-9]*")
+    ld = builder.build(fixed)
+    assert ld.to_json() == LangDefBuilder.new(fixed).to_json()
+    register(ld)
+    assert ld.eval("(1 + 2) * 3", {}) == 9
+
+
+def test_json_cache_eviction(tmp_path):
+    from io_utils.json_cache import JsonCache
+    import os
+
+    cache = JsonCache(tmp_path, max_bytes=300)
+    for i in range(3):
+        cache.put(str(i), ["x" * 90])
+        os.utime(tmp_path / ("%d.json" % i), ns=(i * 10**9, i * 10**9))
+    assert cache.get("0") == ["x" * 90]  # refreshes 0, so 1 is the oldest now
+    cache.put("3", ["x" * 90])
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["0.json", "2.json", "3.json"]
+    assert cache.get("1") is None
+    (tmp_path / "bad.json").write_text("{")
+    assert cache.get("bad") is None
+
+
+def test_ld_bytes(tmp_path):
+    from examples.calc_parallel import GRAMMAR
+
+    ld = LangDefBuilder.new(GRAMMAR)
+    data = ld.to_bytes()
+    (tmp_path / "calc.ldef").write_bytes(data)
+    inputs = ["1 + 2 * (3 - 4)", "-5 * (6 + 7)", "8 * 9 - 10 * -11", ""]
+    for loaded in (LangDef.from_bytes(data), LangDef.from_file(tmp_path / "calc.ldef")):
+        assert loaded.to_bytes() == data
+        for in_ in inputs:
+            assert list(loaded.scan(in_)) == list(ld.scan(in_))
+        loaded.load_productions("examples.calc_parallel:register")
+        ld.load_productions("examples.calc_parallel:register")
+        assert loaded.eval_many(inputs) == ld.eval_many(inputs)
+
+        # json is rebuilt from the tables, and compiles back to the same tables
+        assert LangDef.from_json(loaded.to_json()).to_bytes() == data
+        for key in ("action_json", "goto_json"):
+            assert json.dumps(loaded.to_json()[key], sort_keys=True) == json.dumps(
+                ld.to_json()[key], sort_keys=True
+            )
+
+    with pytest.raises(ValueError):
+        LangDef.from_bytes(b"JSON" + data[4:])
+    for truncated in (b"", data[:10], data[:100], data[:-1]):
+        with pytest.raises(ValueError):
+            LangDef.from_bytes(truncated)
+    (tmp_path / "empty.ldef").write_bytes(b"")
+    with pytest.raises(ValueError):
+        LangDef.from_file(tmp_path / "empty.ldef")
+
+    # closing the map copies the tables out, and the LangDef keeps working
+    with LangDef.from_file(tmp_path / "calc.ldef") as loaded:
+        mapping = loaded._mapping
+        loaded.load_productions("examples.calc_parallel:register")
+    assert mapping.closed and loaded._mapping is None
+    assert loaded.eval_many(inputs) == ld.eval_many(inputs)
+    assert loaded.to_bytes() == data
+    loaded.close()  # closing twice is fine
+
+
+def test_missing_production():
+    ld = LangDefBuilder.new(
+        """
+        START -> E
+        E -> E "+" int_const | int_const
+        int_const -> r"0|[1-9][0-9]*"
+        """
+    )
+
+    @ld.production('int_const -> r"0|[1-9][0-9]*"')
+    def __int(_, int_const: str) -> int:
+        return int(int_const)
+
+    with pytest.raises(KeyError):
+        ld.eval("5 + 6")  # nothing registered for E -> int_const
+
+
 # currently it's still not supported... requires further investigation.
 # def test_ld_parser_mini_grammar_0():
 #     # test if the lr(1) parser satisfies this requirement in rust-analyzer syntax tree:
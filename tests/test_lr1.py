@@ -1,6 +1,8 @@
 from typing import List, Tuple
 from cfg_utils.cfg import ContextFreeGrammar
 from lr1.lr1_itemset_automata import LRItemSetAutomata
+from lr1.closure_templates import ClosureTemplates
+from lr1.lr1_item import LRItem
 from lr1.lr1_io import LRItemSetPrinter, LRItemSetParser, LRItemParser, SymbolParser
 
 
@@ -469,3 +471,178 @@ def test_lr1_table_3():
         j = lr_automata.item_set_to_id[expected_item_sets[dst]]
         assert (SymbolParser.from_string(cfg, edge), j) in lr_automata.edges[i]
     assert sum(len(v) for v in lr_automata.edges.values()) == len(expected_edges)
+
+
+def test_lalr_merges_cores():
+    cfg = ContextFreeGrammar.from_string(
+        """
+        START -> S
+        S -> B B
+        B -> "b" B | "a"
+        """
+    )
+    lr_automata = LRItemSetAutomata.new(cfg)
+    lalr_automata = LRItemSetAutomata.new(cfg, mode="lalr")
+    assert len(lr_automata.item_set_to_id) == 10
+    assert len(lalr_automata.item_set_to_id) == 7
+    assert sorted(lalr_automata.item_set_to_id.values()) == list(range(7))
+    merged = {
+        LRItemSetAutomata.core_of(item_set): item_set
+        for item_set in lalr_automata.item_set_to_id
+    }
+    for item_set in lr_automata.item_set_to_id:
+        by_core = {
+            (item.production_id, item.dot_pos): item.look_forward
+            for item in merged[LRItemSetAutomata.core_of(item_set)].items
+        }
+        for item in item_set.items:
+            assert item.look_forward <= by_core[(item.production_id, item.dot_pos)]
+    assert (
+        LRItemSetParser.from_string(
+            cfg,
+            """
+            B -> "b" ◦ B, $/"a"/"b"
+            B ->  ◦ "b" B, $/"a"/"b"
+            B ->  ◦ "a", $/"a"/"b"
+            """,
+        )
+        in lalr_automata.item_set_to_id
+    )
+    assert sum(len(v) for v in lalr_automata.edges.values()) == 10
+
+
+def test_pager_keeps_lr1_only_states_apart():
+    cfg = ContextFreeGrammar.from_string(
+        """
+        START -> S
+        S -> "a" E "c" | "a" F "d" | "b" F "c" | "b" E "d"
+        E -> "e"
+        F -> "e"
+        """
+    )
+    lr_automata = LRItemSetAutomata.new(cfg)
+    lalr_automata = LRItemSetAutomata.new(cfg, mode="lalr")
+    pager_automata = LRItemSetAutomata.new(cfg, mode="pager")
+    conflicting = LRItemSetParser.from_string(
+        cfg,
+        """
+        E -> "e" ◦ , "c"/"d"
+        F -> "e" ◦ , "d"/"c"
+        """,
+    )
+    assert conflicting in lalr_automata.item_set_to_id
+    assert conflicting not in pager_automata.item_set_to_id
+    assert len(pager_automata.item_set_to_id) == len(lr_automata.item_set_to_id)
+    assert len(lalr_automata.item_set_to_id) < len(lr_automata.item_set_to_id)
+
+
+def test_pager_merges_compatible_states():
+    cfg = ContextFreeGrammar.from_string(
+        """
+        START -> S
+        S -> B B
+        B -> "b" B | "a"
+        """
+    )
+    lalr_automata = LRItemSetAutomata.new(cfg, mode="lalr")
+    pager_automata = LRItemSetAutomata.new(cfg, mode="pager")
+    assert pager_automata.item_set_to_id == lalr_automata.item_set_to_id
+    assert pager_automata.edges == lalr_automata.edges
+
+
+def test_lr_item_set_packed():
+    cfg = ContextFreeGrammar.from_string(
+        """
+        START -> S
+        S -> B B
+        B -> "b" B | "a"
+        """
+    )
+    a = LRItemSetParser.from_string(
+        cfg,
+        """
+        B -> "b" ◦ B, $
+        B ->  ◦ "a", "a"
+        """,
+    )
+    b = LRItemSetParser.from_string(
+        cfg,
+        """
+        B ->  ◦ "a", "a"
+        B -> "b" ◦ B, $
+        """,
+    )
+    assert a == b and hash(a) == hash(b)
+    b.add_lr_item(LRItemParser.from_string(cfg, 'B ->  ◦ "a", "b"'))
+    assert a != b
+    a.add_lr_item(LRItemParser.from_string(cfg, 'B ->  ◦ "a", "b"'))
+    assert a == b and hash(a) == hash(b)
+    assert b == LRItemSetParser.from_string(
+        cfg,
+        """
+        B -> "b" ◦ B, $
+        B ->  ◦ "a", "a"/"b"
+        """,
+    )
+    for item in b.items:
+        assert LRItem.to_bits(item.look_forward) == item.look_forward_bits
+
+
+def test_first_with_nullable_prefix():
+    cfg = ContextFreeGrammar.from_string(
+        """
+        START -> L
+        L -> M L "b" | "a"
+        M -> ''
+        A -> A "c" | B
+        B -> ''
+        """
+    )
+    first = cfg.first()
+    a, b, c = (SymbolParser.from_string(cfg, '"%s"' % s) for s in "abc")
+    assert first["L"] == {a}
+    assert first["M"] == {ContextFreeGrammar.EMPTY}
+    assert first["A"] == {c, ContextFreeGrammar.EMPTY}
+
+
+def test_closure_templates():
+    cfg = ContextFreeGrammar.from_string(
+        """
+        START -> L
+        L -> M L "b" | "a"
+        M -> ''
+        """
+    )
+    templates = ClosureTemplates.new(cfg)
+    b = LRItem.to_bits((SymbolParser.from_string(cfg, '"b"'),))
+    a = LRItem.to_bits((SymbolParser.from_string(cfg, '"a"'),))
+    # L -> ◦ M L "b" | ◦ "a" take the look forward of whatever follows L, and
+    # M -> ◦ '' takes FIRST(L "b")
+    assert sorted(templates.closure["L"]) == [
+        (LRItem.pack(1, 0), 0, True),
+        (LRItem.pack(2, 0), 0, True),
+        (LRItem.pack(3, 0), a, False),
+    ]
+    assert templates.after_dot[LRItem.pack(1, 1)] == ("L", b, False)
+
+
+def test_lr1_new_parallel():
+    cfg = ContextFreeGrammar.from_string(
+        r"""
+        START -> Statement
+        Statement -> Assignment | E
+        E -> E "+" T | E "-" T | "-" T | T
+        T -> T "*" F | T "/" F | T "%" F | F
+        F -> F "**" G | G
+        G -> "(" E ")" | int_const | id
+        Assignment -> id "=" E
+        int_const -> r"0|-?[1-9][0-9]*"
+        id -> r"([a-zA-Z]|\_)([a-zA-Z]|[0-9]|\_)*"
+        """
+    )
+    lr_automata = LRItemSetAutomata.new(cfg)
+    parallel_automata = LRItemSetAutomata.new_parallel(cfg, workers=2)
+    assert list(parallel_automata.item_set_to_id.items()) == list(
+        lr_automata.item_set_to_id.items()
+    )
+    assert parallel_automata.edges == lr_automata.edges